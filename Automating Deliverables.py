@@ -1,22 +1,62 @@
 import tkinter as tk
 from tkinter import ttk
-from tkinter import filedialog
-import openpyxl
-import csv
 import os
-import xlwings as xw
+import queue
+import threading
 from datetime import datetime
 
+from deliverables_core import (
+    STATUS_LIMITS,
+    STATUS_NO_LIMIT,
+    AppendState,
+    ConversionCancelled,
+    MappedCSV,
+    build_fallout_table,
+    build_summary_table,
+    check_end_tests,
+    convert_or_load,
+    default_report,
+    fallout_sheet_names,
+    get_backend,
+    has_limits,
+    lookup_end_test,
+    normalize_label,
+    output_paths,
+    refresh_xlsx,
+    report_path,
+)
+from deliverables_cache import DatasetCache, ResultCache
+from deliverables_timing import RunTimer
+
 # Deliverables Automation Tool
 # Author: Rose Anne Lafuente
 # Description: Automates CSV to Excel workflows with pivot tables,
 # customized formatting, and validation checks for deliverables reporting.
 
+# The layout preview stops looking for the C1_MARK header after this many bytes
+PREVIEW_HEADER_BYTES = 4 * 1024 * 1024
+
+# Status box keeps only the most recent lines; the full history goes to STATUS_LOG
+MAX_STATUS_LINES = 2000
+STATUS_LOG = os.environ.get(
+    "DELIVERABLES_STATUS_LOG",
+    os.path.join(os.path.expanduser("~"), ".deliverables_status.log")
+)
+
+# Fixed set of status colors → Text tags (configured once in create_status_box)
+STATUS_TAGS = {
+    "#000000": "status_info",
+    "black": "status_info",
+    "#d32f2f": "status_error",
+    "#FFBF00": "status_warn",
+}
+
+
 class AutomatingDeliverables:
     def __init__(self, root):
         self.root = root
         self.root.title("Automating Deliverables")
-        self.root.geometry("800x500")
+        self.root.geometry("1150x550")
 
         # Professional Neutral Theme
         self.bg_color = "#f5f5f5"
@@ -29,6 +69,48 @@ class AutomatingDeliverables:
 
         self.path_var = tk.StringVar()
 
+        # Set by convert_to_excel
+        self.out_file = None
+        self.base_name = None
+        self.layout = None
+        self.counts = None
+        self.fallout_table = None   # previewed, written to the Pivot sheet by Save to Excel
+        self.csv_path = None
+        self.preview_mark = None    # C1_MARK of fallout_table
+        self.end_test_rows = None   # End Test rows checked for preview_mark, saved with it
+        self.end_test_top_n = None  # how many End Test Nos. end_test_rows checked
+        self.pivot_mark = None      # C1_MARK of the fallout table on the Pivot sheet
+        self.pivot_top_n = None     # top N of the End Test rows at H3 there (None = none)
+        self.excel_pivot_mark = None    # C1_MARK of the Excel PivotTable in the data workbook
+        self.append_state = None    # where the CSV ended at the last convert / refresh
+
+        # Parsed CSVs are remembered on disk, so reopening a known file is instant
+        self.cache = DatasetCache()
+
+        # Fallout tables / End Test rows per (CSV version, C1_MARK), so
+        # switching back to a mark redraws without recomputing
+        self.results = ResultCache()
+
+        # Background job state (see run_job)
+        self.job_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.job_running = False
+        self.job_timer = None
+        self.action_buttons = []
+
+        # Excel access: openpyxl for every sheet write (created on first use, so
+        # openpyxl is not imported at startup); the xlwings backend (one reused
+        # hidden Excel) is only created when a PivotTable is asked for
+        self._backend = None
+        self.excel = None
+
+        # One long-lived worker thread runs every job, so the Excel COM
+        # objects always stay on the thread that created them
+        self.worker_jobs = queue.Queue()
+        self.worker = threading.Thread(target=self.worker_loop, daemon=True)
+        self.worker.start()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+
         self.create_file_selection_frame()
 
         # Show filter selector immediately (empty at first)
@@ -71,9 +153,22 @@ class AutomatingDeliverables:
             activebackground=self.btn_active
         )
         convert_btn.pack(side="right", padx=10, pady=5)
+        # Refresh button: only parse rows appended to the CSV since the last convert
+        refresh_btn = tk.Button(
+            input_frame,
+            text="Refresh",
+            width=12,
+            command=self.refresh_excel,
+            bg=self.btn_bg,
+            fg=self.fg_color,
+            activebackground=self.btn_active
+        )
+        refresh_btn.pack(side="right", pady=5)
         # Browse button inside the frame
         browse_btn = tk.Button(input_frame, text="Browse", width=12, command=self.browse_file)
-        browse_btn.pack(side="right", pady=5)
+        browse_btn.pack(side="right", padx=10, pady=5)
+
+        self.action_buttons += [convert_btn, refresh_btn, browse_btn]
 
 
     def get_unique_c1_mark_values(raw_items):
@@ -141,6 +236,43 @@ class AutomatingDeliverables:
             activebackground=self.btn_active
         )
         check_test_btn.pack(side="left", padx=10)
+
+        # How many fallout rows Check End Test No covers (1 = top fail only, 0 = all)
+        tk.Label(filter_frame, text="Top N:").pack(side="left")
+        self.top_n_var = tk.IntVar(value=1)
+        tk.Spinbox(filter_frame, from_=0, to=999, width=4, textvariable=self.top_n_var).pack(side="left", padx=(2, 10))
+
+        save_btn = tk.Button(
+            filter_frame,
+            text="Save to Excel",
+            width=14,
+            command=self.save_to_excel,
+            bg=self.btn_bg,
+            fg=self.fg_color,
+            activebackground=self.btn_active
+        )
+        save_btn.pack(side="left", padx=10)
+
+        gen_all_btn = tk.Button(
+            filter_frame,
+            text="Generate All Marks",
+            width=18,
+            command=self.generate_all_pivots,
+            bg=self.btn_bg,
+            fg=self.fg_color,
+            activebackground=self.btn_active
+        )
+        gen_all_btn.pack(side="left", padx=10)
+
+        self.action_buttons += [gen_pivot_btn, check_test_btn, save_btn, gen_all_btn]
+
+        # Optional: also build a real Excel PivotTable (needs Excel)
+        self.excel_pivot_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            filter_frame,
+            text="Excel PivotTable",
+            variable=self.excel_pivot_var
+        ).pack(side="left", padx=5)
             
     def create_status_box(self):
         status_frame = tk.LabelFrame(self.root, text="", padx=10, pady=10)
@@ -156,6 +288,15 @@ class AutomatingDeliverables:
         )
         self.status_box.pack(fill="both", expand=True)
 
+        for color, tag in STATUS_TAGS.items():
+            self.status_box.tag_config(tag, foreground=color)
+
+        # Full history is streamed here (line buffered); None if the file can't be opened
+        try:
+            self.status_log = open(STATUS_LOG, "a", encoding="utf-8", buffering=1)
+        except OSError:
+            self.status_log = None
+
     def create_exit_button(self):
         # Create an "invisible" frame with same background as root
         exit_frame = tk.Frame(self.root, bg=self.bg_color)
@@ -163,7 +304,7 @@ class AutomatingDeliverables:
 
         # Place Exit button aligned right
         exit_btn = tk.Button(exit_frame, text="EXIT", width=12,
-                             bg="#d32f2f", fg="white", command=self.root.destroy)
+                             bg="#d32f2f", fg="white", command=self.close)
         exit_btn.pack(side="right", pady=10)
 
         clear_btn = tk.Button(exit_frame, text="Clear All", width=12,
@@ -171,10 +312,28 @@ class AutomatingDeliverables:
                       bg=self.btn_bg, fg=self.fg_color, activebackground=self.btn_active)
         clear_btn.pack(side="right", padx=10)
 
+        # Progress of the running job (bytes read for conversions) + Cancel
+        self.progress_var = tk.DoubleVar(value=0)
+        progress_bar = ttk.Progressbar(
+            exit_frame,
+            variable=self.progress_var,
+            maximum=100,
+            mode="determinate",
+            length=300
+        )
+        progress_bar.pack(side="left", pady=10)
+
+        self.cancel_btn = tk.Button(exit_frame, text="Cancel", width=12,
+                                    command=self.cancel_job, state="disabled",
+                                    bg=self.btn_bg, fg=self.fg_color, activebackground=self.btn_active)
+        self.cancel_btn.pack(side="left", padx=10)
+
+        self.action_buttons.append(clear_btn)
+
     def show_status(self, message, color=None, clear=False):
-        # Default to black unless explicitly set to red
-        if color is None:
-            color = "#000000"  # black
+        # Default to black unless explicitly set to red / amber.
+        # Multi-line messages (preview tables) go in as one insert.
+        tag = STATUS_TAGS.get(color or "#000000", "status_info")
 
         self.status_box.config(state="normal")
 
@@ -182,18 +341,24 @@ class AutomatingDeliverables:
             self.status_box.delete("1.0", "end")
 
         if message:
-            self.status_box.insert("end", message + "\n")
+            self.status_box.insert("end", message + "\n", tag)
 
-            # Unique tag per line so colors don't overwrite
-            line_tag = f"status_{self.status_box.index('end-2l')}"
-            start_index = self.status_box.index("end-2l")
-            end_index = self.status_box.index("end-1c")
-            self.status_box.tag_add(line_tag, start_index, end_index)
-            self.status_box.tag_config(line_tag, foreground=color)
+            # Ring buffer: drop the oldest lines once over the cap
+            excess = int(self.status_box.index("end-1c").split(".")[0]) - 1 - MAX_STATUS_LINES
+            if excess > 0:
+                self.status_box.delete("1.0", f"{excess + 1}.0")
+            self.status_box.see("end")
+
+            if self.status_log:
+                try:
+                    self.status_log.write(f"{datetime.now():%Y-%m-%d %H:%M:%S} {message.strip()}\n")
+                except OSError:
+                    pass
 
         self.status_box.config(state="disabled")
         
     def browse_file(self):
+        from tkinter import filedialog
         file_path = filedialog.askopenfilename(
             title="Select CSV File",
             filetypes=[("CSV files", "*.csv")]
@@ -202,6 +367,37 @@ class AutomatingDeliverables:
             self.path_var.set(file_path)
             # Just show status that file is selected
             self.show_status(f"📂 Selected file:{file_path}", color="black")
+            if not self.job_running:
+                self.show_layout_preview(file_path)
+
+    def show_layout_preview(self, file_path):
+        # --- Quick look at the layout: header block only (capped), the data section is not read ---
+        def job():
+            with MappedCSV(file_path, header_limit=PREVIEW_HEADER_BYTES) as mapped:
+                estimate = mapped.data.estimate_rows() if mapped.data else 0
+                return mapped.layout, mapped.header_truncated, estimate
+
+        def done(result):
+            layout, truncated, estimate = result
+            if truncated:
+                self.show_status(
+                    f"⚠️ No C1_MARK header in the first {PREVIEW_HEADER_BYTES // (1024 * 1024)} MB — no layout preview.",
+                    color="#FFBF00"
+                )
+                return
+
+            if layout.c1_mark_row is None:
+                self.show_status("⚠️ First non-empty cell in Column G is not 'C1_MARK'.", color="#FFBF00")
+                return
+            if not layout.et_col or not layout.ft_col:
+                self.show_status("⚠️ 'ET'/'FT' columns not found to the right of C1_MARK", color="#FFBF00")
+
+            self.show_status(
+                f"🔍 THEORETICAL_NUM: {layout.theoretical_num} · {len(layout.reference)} reference tests · "
+                f"{len(layout.columns)} data columns · ~{estimate:,} rows"
+            )
+
+        self.run_job(job, done, "⚠️ Could not read the CSV layout")
             
     def convert_to_excel(self):
         file_path = self.path_var.get()
@@ -209,76 +405,138 @@ class AutomatingDeliverables:
             self.show_status("⚠️ No file selected. Please browse for a CSV first.", color="#d32f2f")
             return
 
-        try:
-            # --- Convert CSV to Excel ---
-            wb = openpyxl.Workbook()
-            ws = wb.active
-
-            sheet_name = os.path.splitext(os.path.basename(file_path))[0]
-            ws.title = sheet_name[:31].replace(":", "_").replace("/", "_").replace("\\", "_")
-
-            with open(file_path, newline='', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                for r_idx, row in enumerate(reader, 1):
-                    for c_idx, value in enumerate(row, 1):
-                        try:
-                            if value.isdigit():
-                                ws.cell(row=r_idx, column=c_idx).value = int(value)
-                            else:
-                                ws.cell(row=r_idx, column=c_idx).value = float(value)
-                        except ValueError:
-                            ws.cell(row=r_idx, column=c_idx).value = value
-
-            out_file = os.path.splitext(file_path)[0] + ".xlsx"
-            wb.save(out_file)
-            wb.close()
-
-            # --- Open with xlwings to read filter items ---
-            app = xw.App(visible=False)
-            wb_xlw = app.books.open(out_file)
-            sht = wb_xlw.sheets[0]
-
-            # Find header row in Column G
-            first_row = sht.range("G1").end("down").row
-            header_value = sht.range(f"G{first_row}").value
-            if header_value != "C1_MARK":
-                self.show_status("❌ First non-empty cell in Column G is not 'C1_MARK'.", color="#d32f2f")
-                wb_xlw.close()
-                app.quit()
-                return
-
-            # Collect filter items from C1_MARK column
-            last_row = sht.range((first_row, 7)).end("down").row
-            raw_items = sht.range((first_row+1, 7), (last_row, 7)).value
+        # --- Convert CSV to Excel (streamed, constant memory) on the worker thread ---
+        out_file, sheet_name = output_paths(file_path)
+        self.show_status(f"ℹ️ Converting {file_path} …")
+        timer = RunTimer("convert", file_path)
+        state = AppendState()
+
+        def job():
+            return convert_or_load(
+                file_path, out_file, sheet_name,
+                cache=self.cache,
+                progress=self.report_progress,
+                cancel=self.cancel_event,
+                timer=timer,
+                state=state,
+                report=default_report
+            )
 
-            # ✅ Clean and deduplicate (case-sensitive)
-            def get_unique_c1_mark_values(raw_items):
-                flat = []
-                for item in raw_items:
-                    if isinstance(item, list):
-                        flat.extend(item)
-                    elif item is not None:
-                        flat.append(item)
-                cleaned = [str(i).strip() for i in flat if i]
-                return list(dict.fromkeys(cleaned))  # preserves order, case-sensitive
+        def done(result):
+            layout, counts, row_count, elapsed, from_cache = result
+            rows_per_sec = row_count / elapsed if elapsed > 0 else row_count
 
-            unique_items = get_unique_c1_mark_values(raw_items)
+            if layout.c1_mark_row is None:
+                self.show_status("❌ First non-empty cell in Column G is not 'C1_MARK'.", color="#d32f2f")
+                return
 
             # Update Combobox values
-            self.filter_dropdown['values'] = unique_items
+            self.filter_dropdown['values'] = layout.c1_marks
 
-            # Keep workbook reference for later pivot creation
+            # Keep workbook reference and layout for pivot / End Test steps
             self.out_file = out_file
             self.base_name = sheet_name
-            wb_xlw.close()
-            app.quit()
+            self.layout = layout
+            self.counts = counts
+            self.fallout_table = None
+            self.csv_path = file_path
+            self.preview_mark = None
+            self.end_test_rows = None
+            self.pivot_mark = None
+            self.pivot_top_n = None
+            self.excel_pivot_mark = None
+            self.append_state = state
+
+            if from_cache:
+                self.show_status(
+                    f"⚡ Loaded from cache ({elapsed * 1000:.0f} ms): {row_count:,} rows\nFile: {out_file}\n\nFilter options loaded."
+                )
+            else:
+                self.show_status(
+                    f"✅ Conversion complete: CSV → .xlsx\nFile saved at: {out_file}\n"
+                    f"Rows written: {row_count:,} in {elapsed:.2f}s ({rows_per_sec:,.0f} rows/s)\n\nFilter options loaded."
+                )
+            self.show_held_line(state)
 
-            self.show_status(
-                f"✅ Conversion complete: CSV → .xlsx\nFile saved at: {out_file}\n\nFilter options loaded."
+        self.run_job(job, done, "❌ Error", timer)
+
+    def show_held_line(self, state):
+        # An unterminated last line may still be being written; the next Refresh picks it up
+        if state.tail is not None:
+            self.show_status("ℹ️ The CSV's last line is not finished yet — it is left for the next Refresh.")
+
+    def refresh_excel(self):
+        # --- Incremental update: append new CSV rows to the data sheet, update the fallout table ---
+        if self.append_state is None:
+            self.show_status("⚠️ Please convert a CSV to Excel first.", color="#d32f2f")
+            return
+
+        file_path, out_file, base_name = self.csv_path, self.out_file, self.base_name
+        state, pivot_mark, pivot_top_n = self.append_state, self.pivot_mark, self.pivot_top_n
+        self.show_status(f"ℹ️ Refreshing {file_path} …")
+        timer = RunTimer("refresh", file_path)
+
+        def job():
+            return refresh_xlsx(
+                file_path, out_file, base_name, state,
+                pivot_mark=pivot_mark,
+                cache=self.cache,
+                progress=self.report_progress,
+                cancel=self.cancel_event,
+                timer=timer,
+                end_test_top_n=pivot_top_n
             )
 
-        except Exception as e:
-            self.show_status(f"❌ Error: {e}", color="#d32f2f")
+        def done(result):
+            new_state, new_rows, rebuilt, fallout_table, end_test_rows = result
+            # Results computed from the previous version of the CSV are stale now
+            if new_state.fingerprint != state.fingerprint:
+                self.results.invalidate((file_path, state.fingerprint))
+            self.append_state = new_state
+            self.layout = new_state.layout
+            self.counts = new_state.counts
+            self.filter_dropdown['values'] = new_state.layout.c1_marks
+
+            if (new_rows or rebuilt) and self.excel_pivot_mark is not None:
+                # Excel saved the data workbook, so new rows could only go in by converting it again
+                self.show_status(
+                    f"⚠️ The Excel PivotTable for {self.excel_pivot_mark} was dropped: the refresh rebuilt "
+                    f"{out_file}. Save with \"Excel PivotTable\" ticked to add it again.",
+                    color="#FFBF00"
+                )
+                self.excel_pivot_mark = None
+
+            if rebuilt:
+                # Rebuilt workbook: the Pivot sheet (if any) was re-checked against the new data
+                self.fallout_table = fallout_table
+                if fallout_table is None:
+                    self.pivot_mark = None
+                    self.pivot_top_n = None
+                self.show_status(
+                    f"⚠️ CSV was truncated or rewritten — rebuilt from scratch: {new_rows:,} rows",
+                    color="#FFBF00"
+                )
+            elif new_rows == 0:
+                self.show_status("ℹ️ No new rows since the last refresh.")
+                self.show_held_line(new_state)
+                return
+            else:
+                self.show_status(f"✅ {new_rows:,} new rows appended ({new_state.row_count:,} total)\nFile: {out_file}")
+                if fallout_table is not None:
+                    self.fallout_table = fallout_table
+
+            if fallout_table is not None:
+                self.results.put(((file_path, new_state.fingerprint), pivot_mark, "fallout"), fallout_table)
+                self.preview_mark = pivot_mark
+                # The End Test rows at H3 were checked again against the new ranking
+                self.end_test_rows = end_test_rows or None
+                self.end_test_top_n = pivot_top_n
+                self.show_fallout_preview(fallout_table)
+                updated = "Fallout table + End Test rows" if end_test_rows else "Fallout table"
+                self.show_status(f"✅ {updated} updated for {pivot_mark}")
+            self.show_held_line(new_state)
+
+        self.run_job(job, done, "❌ Error refreshing", timer)
 
 
     def generate_pivot(self):
@@ -287,285 +545,371 @@ class AutomatingDeliverables:
             self.show_status("⚠️ Please select a C1_MARK value first.", color="#d32f2f")
             return
 
+        if self.layout is None:
+            self.show_status("⚠️ Please convert a CSV to Excel first.", color="#d32f2f")
+            return
+
         self.show_status(f"ℹ️ Generating pivot for selected C1_MARK: {selected}")
 
-        app = None
-        wb_xlw = None
-        try:
-            app = xw.App(visible=False)
-            wb_xlw = app.books.open(self.out_file)
-            sht = wb_xlw.sheets[self.base_name]
-
-            # --- Find header row in Column G ---
-            first_row = sht.range("G1").end("down").row
-            header_value = sht.range(f"G{first_row}").value
-            if str(header_value).strip().upper() != "C1_MARK":
-                raise ValueError("First non-empty cell in Column G is not 'C1_MARK'")
-
-            # --- Find ET header to the right of C1_MARK ---
-            row_values = sht.range((first_row, 7), (first_row, sht.range((first_row, 7)).end("right").column)).value
-            et_col = None
-            for idx, val in enumerate(row_values, start=7):
-                if str(val).strip().upper() == "ET":
-                    et_col = idx
-                    break
-            if not et_col:
-                raise ValueError("'ET' column not found to the right of C1_MARK")
-
-            # --- Define pivot source range (C1_MARK → ET, down to last row in Column G) ---
-            last_row = sht.range((first_row, 7)).end("down").row
-            pivot_range = sht.range((first_row, 7), (last_row, et_col))
-
-            # --- Create Pivot sheet ---
-            pivot_sheet = wb_xlw.sheets.add("Pivot", after=sht)
-
-            # --- Create pivot cache and table ---
-            pivot_cache = wb_xlw.api.PivotCaches().Create(
-                SourceType=1,  # xlDatabase
-                SourceData=pivot_range.api
-            )
-            table_name = f"PivotTable_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-            pivot_table = pivot_cache.CreatePivotTable(
-                TableDestination=pivot_sheet.range("A3").api,
-                TableName=table_name
-            )
+        layout = self.layout
+        if not layout.et_col or not layout.ft_col:
+            self.show_status("❌ Error generating pivot/fallout: 'ET'/'FT' columns not found to the right of C1_MARK", color="#d32f2f")
+            return
 
-            # --- Filter: C1_MARK ---
-            pf = pivot_table.PivotFields("C1_MARK")
-            pf.Orientation = 3
-            valid_items = [item.Name for item in pf.PivotItems()]
-            if selected in valid_items:
-                pf.CurrentPage = selected
-                self.show_status(f"\nApplied filter: {selected}")
-            else:
-                self.show_status(f"⚠️ Selected '{selected}' not found in C1_MARK items {valid_items}", color="#d32f2f")
-                return
+        # --- Filter: C1_MARK ---
+        valid_items = layout.c1_marks
+        if selected in valid_items:
+            self.show_status(f"\nApplied filter: {selected}")
+        else:
+            self.show_status(f"⚠️ Selected '{selected}' not found in C1_MARK items {valid_items}", color="#d32f2f")
+            return
+
+        dataset = self.dataset_key()
+        if dataset is None:
+            return
 
-            # --- Rows: ET ---
-            pivot_table.PivotFields("ET").Orientation = 1
+        # --- Fallout Table Logic (Count of FT by ET), memoized per CSV version and mark ---
+        key = (dataset, selected, "fallout")
+        fallout_table = self.results.get(key)
+        if fallout_table is None:
+            fallout_table = build_fallout_table(self.counts.for_mark(selected), layout.theoretical_num)
+            self.results.put(key, fallout_table)
+            note = ""
+        else:
+            note = " (from memory)"
+
+        self.fallout_table = fallout_table
+        self.preview_mark = selected
+        self.end_test_rows = None
+        self.show_fallout_preview(fallout_table)
+
+        self.show_status(f"\n✅ Fallout table ready for {selected}{note} — Save to Excel writes the Pivot sheet")
+
+    def dataset_key(self):
+        # Identifies the parsed CSV version for self.results; None (with a
+        # warning, memo entries dropped) if the file changed since the last
+        # convert / refresh
+        dataset = (self.csv_path, self.append_state.fingerprint)
+        try:
+            change = self.append_state.check(self.csv_path)
+        except OSError:
+            change = "rewritten"
+        if change == "same":
+            return dataset
+
+        self.results.invalidate(dataset)
+        self.show_status("⚠️ The CSV changed since it was converted. Please press Refresh first.", color="#FFBF00")
+        return None
+
+    def save_to_excel(self):
+        # --- Write the previewed fallout table (D3) and its End Test rows (H3) to the Pivot sheet of the report workbook ---
+        if self.layout is None:
+            self.show_status("⚠️ Please convert a CSV to Excel first.", color="#d32f2f")
+            return
+        if not self.fallout_table:
+            self.show_status("⚠️ Please generate the pivot table first.", color="#d32f2f")
+            return
 
-            # --- Values: Count of FT ---
-            pivot_table.AddDataField(
-                pivot_table.PivotFields("FT"),
-                "Count of FT",
-                -4112  # xlCount
+        selected, fallout_table, end_test_rows = self.preview_mark, self.fallout_table, self.end_test_rows
+        end_test_top_n = self.end_test_top_n if end_test_rows else None
+        out_file, base_name, layout = self.out_file, self.base_name, self.layout
+        report_file = report_path(out_file)
+        excel_pivot = self.excel_pivot_var.get()
+        timer = RunTimer(f"pivot {selected}", report_file)
+
+        def job():
+            # An empty End Test list clears rows left at H3 by an earlier save
+            self.backend.write_report(
+                report_file,
+                sheets={"Pivot": fallout_table},
+                end_tests={"Pivot": end_test_rows or []},
+                timer=timer
             )
 
-            # --- Fallout Table Logic ---
-            data = pivot_sheet.range("A4").expand().value
-            sheet = wb_xlw.sheets[self.base_name]
-            theoretical_num = None
-            for i, val in enumerate(sheet.range("A:A").value, start=1):
-                if str(val).strip().upper() == "THEORETICAL_NUM":
-                    theoretical_num = sheet.range((i, 1)).offset(0, 2).value
-                    break
-
-            fallout_table = []
-            for row in data:
-                if not row or not row[0] or str(row[0]).strip().lower() == "grand total":
-                    continue
-                et_val = str(int(row[0])) if isinstance(row[0], (int, float)) and float(row[0]).is_integer() else str(row[0])
-                count_val = int(row[1]) if isinstance(row[1], (int, float)) and float(row[1]).is_integer() else row[1]
-                fallout = (float(row[1]) / theoretical_num * 100) if theoretical_num else 0
-                fallout_table.append([et_val, count_val, f"{fallout:.2f}%"])
-
-            fallout_table.sort(key=lambda x: int(x[1]), reverse=True)
-            grand_total_val = str(int(theoretical_num)) if isinstance(theoretical_num, (int, float)) and float(theoretical_num).is_integer() else str(theoretical_num)
-            fallout_table.append(["Grand Total", grand_total_val, ""])
-
-
-            # --- Write fallout table into Excel at D3 ---
-            start_cell = pivot_sheet.range("D3")
-            start_cell.value = ["End Test No.", "Count", "Fallout%"]
-            pivot_sheet.range(start_cell.row+1, start_cell.column).value = fallout_table
-
-            # --- Apply formatting ---
-            last_row_ft = start_cell.row + len(fallout_table)  # last row of fallout table
-            fallout_range = pivot_sheet.range(f"D3:F{last_row_ft}")
-
-            # Header row (D3:F3)
-            header_range = pivot_sheet.range("D3:F3")
-            header_range.color = (192, 230, 245)   # #C0E6F5
-            header_range.api.Font.Bold = True
-
-            # First data row (D4:F4)
-            first_data_range = pivot_sheet.range("D4:F4")
-            first_data_range.color = (255, 159, 159)   # #FF9F9F
-            first_data_range.api.Font.Bold = True
-
-            # Grand Total row (last row)
-            grand_total_range = pivot_sheet.range(f"D{last_row_ft}:F{last_row_ft}")
-            grand_total_range.color = (192, 230, 245)   # #C0E6F5
-            grand_total_range.api.Font.Bold = True
-
-            # Borders: all inside thin, outside thick
-            for i in range(7, 13):  # xlEdgeLeft=7, xlEdgeTop=8, xlEdgeBottom=9, xlEdgeRight=10, xlInsideVertical=11, xlInsideHorizontal=12
-                fallout_range.api.Borders(i).Weight = 2  # xlThin inside
-            for i in [7, 8, 9, 10]:
-                fallout_range.api.Borders(i).Weight = 3  # xlThick outside
-
-            # ✅ HOI: Center horizontally, middle vertically, reset indent
-            fallout_range.api.HorizontalAlignment = -4108  # xlCenter
-            fallout_range.api.VerticalAlignment = -4108    # xlCenter
-            fallout_range.api.IndentLevel = 0              # no indentation
-            
-            wb_xlw.save()
-
-            # --- Show fallout table in status box ---
-            self.status_box.config(state="normal")
-            #self.status_box.delete("1.0", tk.END)
-            self.status_box.insert(tk.END, "\nPreview Table:\n")
-            self.status_box.insert(tk.END, f"{'End Test No.':<15}{'Count':<10}{'Fallout%'}\n")
-            self.status_box.insert(tk.END, "-" * 40 + "\n")
-            for et_val, count_val, fallout_val in fallout_table:
-                self.status_box.insert(
-                    tk.END,
-                    f"{str(et_val).strip():<15}{str(count_val):<10}{str(fallout_val)}\n"
+            # --- Optional Excel PivotTable at A3 ---
+            if excel_pivot:
+                try:
+                    if self.excel is None:
+                        self.excel = get_backend("xlwings")
+                    self.excel.add_pivot_table(out_file, base_name, layout, selected, timer)
+                except Exception as e:
+                    return str(e)
+            return None
+
+        def done(pivot_error):
+            self.pivot_mark = selected
+            self.pivot_top_n = end_test_top_n
+            if pivot_error:
+                self.show_status(f"⚠️ Excel PivotTable skipped: {pivot_error}", color="#FFBF00")
+            elif excel_pivot:
+                # The PivotTable lives in the data workbook, which the next Refresh with new rows rebuilds
+                self.excel_pivot_mark = selected
+                self.show_status(
+                    f"ℹ️ Excel PivotTable for {selected} added to the Pivot sheet of {out_file}. "
+                    "A Refresh that finds new rows rebuilds that workbook without it."
                 )
-            self.status_box.config(state="disabled")
 
-            self.show_status(f"\n✅ Pivot + Fallout table generated with filter {selected}")
+            written = "Fallout table + End Test rows" if end_test_rows else "Fallout table"
+            self.show_status(f"\n✅ {written} for {selected} saved to the Pivot sheet\nFile: {report_file}")
 
-        except Exception as e:
-            self.show_status(f"❌ Error generating pivot/fallout: {e}", color="#d32f2f")
+        self.run_job(job, done, "❌ Error saving the Pivot sheet", timer)
+
+    def show_fallout_preview(self, fallout_table):
+        # --- Show fallout table in status box ---
+        lines = ["\nPreview Table:", f"{'End Test No.':<15}{'Count':<10}{'Fallout%'}", "-" * 40]
+        for et_val, count_val, fallout_val in fallout_table:
+            lines.append(f"{str(et_val).strip():<15}{str(count_val):<10}{str(fallout_val)}")
+        self.show_status("\n".join(lines))
+
+    def generate_all_pivots(self):
+        if self.layout is None:
+            self.show_status("⚠️ Please convert a CSV to Excel first.", color="#d32f2f")
+            return
+
+        self.show_status("ℹ️ Generating fallout tables for all C1_MARK values")
 
-        finally:
-            if wb_xlw:
-                try: wb_xlw.close()
-                except: pass
-            if app:
-                try: app.quit()
-                except: pass
+        layout = self.layout
+        if not layout.et_col or not layout.ft_col:
+            self.show_status("❌ Error generating all pivots: 'ET'/'FT' columns not found to the right of C1_MARK", color="#d32f2f")
+            return
 
+        dataset = self.dataset_key()
+        if dataset is None:
+            return
+        timer = RunTimer("all pivots", self.out_file)
+
+        # --- One grouped pass over the (C1_MARK, ET) counts; memoized tables are reused ---
+        with timer.span("fallout tables", rows=len(layout.c1_marks)):
+            grouped = self.counts.by_mark()
+            tables = {}
+            for mark in layout.c1_marks:
+                key = (dataset, mark, "fallout")
+                tables[mark] = self.results.get(key)
+                if tables[mark] is None:
+                    tables[mark] = build_fallout_table(grouped.get(mark, {}), layout.theoretical_num)
+                    self.results.put(key, tables[mark])
+            summary = build_summary_table(tables, layout.theoretical_num)
+
+        # --- One sheet per mark plus Summary, single save ---
+        names = fallout_sheet_names(tables, reserved=[self.base_name, "Summary"])
+        sheets = {names[mark]: fallout_table for mark, fallout_table in tables.items()}
+        report_file = report_path(self.out_file)
+
+        def job():
+            self.backend.write_report(report_file, sheets=sheets, summary=summary, timer=timer)
+
+        def done(_):
+            # --- Show summary in status box ---
+            lines = ["\nSummary:", f"{'C1_MARK':<15}{'Fails':<10}{'Fallout%':<10}{'Top End Test No.'}", "-" * 55]
+            for mark, fails, fallout, top_et, top_count in summary:
+                lines.append(f"{mark:<15}{fails:<10}{fallout:<10}{top_et} ({top_count})")
+            self.show_status("\n".join(lines))
+
+            self.show_status(f"\n✅ {len(sheets)} fallout sheets + Summary written to {report_file}")
+
+        self.run_job(job, done, "❌ Error generating all pivots", timer)
 
     def check_end_test(self):
         #self.show_status("\n🔍 Check End Test No clicked.")
+        if self.layout is None:
+            self.show_status("⚠️ Please convert a CSV to Excel first.", color="#d32f2f")
+            return
+        if not self.fallout_table:
+            self.show_status("⚠️ Please generate the pivot table first.", color="#d32f2f")
+            return
 
-        app = None
-        wb_xlw = None
         try:
-            app = xw.App(visible=False)
-            wb_xlw = app.books.open(self.out_file)
+            top_n = int(self.top_n_var.get())
+        except (tk.TclError, ValueError):
+            top_n = 1
+        if top_n != 1:
+            self.check_end_tests_batch(top_n)
+            return
 
-            # --- Ensure Pivot sheet exists ---
-            try:
-                pivot_sheet = wb_xlw.sheets["Pivot"]
-            except:
-                pivot_sheet = wb_xlw.sheets.add("Pivot")
-
-            data_sheet = wb_xlw.sheets[self.base_name]
-
-            # --- Get highest fails End Test No from D4 (force string) ---
-            raw_val = pivot_sheet.range("D4").value
-            if raw_val is None:
-                end_test_no = ""
-            elif isinstance(raw_val, float) and raw_val.is_integer():
-                end_test_no = str(int(raw_val))  # avoid .0
-            else:
-                end_test_no = str(raw_val).strip()
+        dataset = self.dataset_key()
+        if dataset is None:
+            return
+
+        try:
+            # --- Highest fails End Test No = first row of the fallout table (D4) ---
+            end_test_no = normalize_label(self.fallout_table[0][0]) if len(self.fallout_table) > 1 else ""
 
             self.show_status(f"\n🔍Checking End Test No.: {end_test_no}")
 
-            # --- Find LOLIMIT row in Column F ---
-            lolimit_row = data_sheet.range("F1").end("down").row
-            lolimit_val = data_sheet.range(f"F{lolimit_row}").value
-            if str(lolimit_val).strip().upper() != "LOLIMIT":
-                raise ValueError("LOLIMIT not found in Column F")
-
-            # --- Expand reference table ---
-            ref_range = data_sheet.range((lolimit_row, 1)).expand("table")
-
-            # --- Locate TESTNO column (Column B) ---
-            testno_values = data_sheet.range(
-                (lolimit_row + 1, 2),
-                (lolimit_row + ref_range.rows.count - 1, 2)
-            ).value
-
-            # Normalize TESTNO values to strings
-            testno_values = ["" if v is None else str(int(v)) if isinstance(v, float) and v.is_integer() else str(v).strip() for v in testno_values]
-
-            found_row = None
-            if end_test_no in testno_values:
-                idx = testno_values.index(end_test_no) + lolimit_row + 1
-                found_row = idx
-
-            # --- Write End Test No. reference table into Excel at H3 ---
-            start_cell = pivot_sheet.range("H3")
-            start_cell.value = ["TSNO", "TESTNO", "COMMENT", "MODE", "HILIMIT", "LOLIMIT"]
-
-            if found_row:
-                row_values = data_sheet.range((found_row, 1), (found_row, 6)).value
-                row_values = ["" if v is None else str(v).strip() for v in row_values]
-
-                # Write row at H4:M4
-                pivot_sheet.range(start_cell.row+1, start_cell.column).value = row_values
-
-                # --- Apply formatting ---
-                last_row = start_cell.row + 1
-                ref_range_excel = pivot_sheet.range(f"H3:M{last_row}")
-
-                # Header row (H3:M3)
-                header_range = pivot_sheet.range("H3:M3")
-                header_range.color = (192, 230, 245)   # #C0E6F5
-                header_range.api.Font.Bold = True
-
-                # Data row (H4:M4)
-                data_range = pivot_sheet.range("H4:M4")
-                data_range.color = (255, 255, 255)     # white background
-                data_range.api.Font.Bold = False
-
-                # Borders: all inside thin, outside thick
-                for i in range(7, 13):  # xlEdgeLeft=7, xlEdgeTop=8, xlEdgeBottom=9, xlEdgeRight=10, xlInsideVertical=11, xlInsideHorizontal=12
-                    ref_range_excel.api.Borders(i).Weight = 2
-                for i in [7, 8, 9, 10]:
-                    ref_range_excel.api.Borders(i).Weight = 3
-
-                # Center horizontally and vertically
-                ref_range_excel.api.HorizontalAlignment = -4108  # xlCenter
-                ref_range_excel.api.VerticalAlignment = -4108    # xlCenter
-                ref_range_excel.api.IndentLevel = 0
-
-                wb_xlw.save()
-
-                # --- Show End Test No. table in status box ---
-                self.status_box.config(state="normal")
-                self.status_box.insert(tk.END, "\nEnd Test No. Reference:\n")
-                self.status_box.insert(
-                    tk.END,
-                    f"{'TSNO':<10}{'TESTNO':<10}{'COMMENT':<15}{'MODE':<10}{'HILIMIT':<10}{'LOLIMIT'}\n"
-                )
-                self.status_box.insert(tk.END, "-" * 70 + "\n")
+            # --- Reference row from the layout index, memoized with the fallout table ---
+            key = (dataset, self.preview_mark, "end_test", 1)
+            rows = self.results.get(key)
+            if rows is None:
+                row_values = lookup_end_test(self.layout, end_test_no)
+                rows = [row_values] if row_values else []
+                self.results.put(key, rows)
+        except Exception as e:
+            self.show_status(f"\n❌ Error checking End Test No: {e}", color="#d32f2f")
+            return
 
-                tsno, testno, comment, mode, hilimit, lolimit = row_values
-                self.status_box.insert(
-                    tk.END,
-                    f"{tsno:<10}{testno:<10}{comment:<15}{mode:<10}{hilimit:<10}{lolimit}\n"
-                )
-                self.status_box.config(state="disabled")
+        if not rows:
+            self.show_status("\n❌ No End Test No. found in the TESTNO Column", color="#d32f2f")
+            return
+        self.end_test_rows = rows
+        self.end_test_top_n = 1
+
+        # --- Show End Test No. table in status box (written at H3 by Save to Excel) ---
+        tsno, testno, comment, mode, hilimit, lolimit = rows[0]
+        self.show_status("\n".join([
+            "\nEnd Test No. Reference:",
+            f"{'TSNO':<10}{'TESTNO':<10}{'COMMENT':<15}{'MODE':<10}{'HILIMIT':<10}{'LOLIMIT'}",
+            "-" * 70,
+            f"{tsno:<10}{testno:<10}{comment:<15}{mode:<10}{hilimit:<10}{lolimit}",
+        ]))
+
+        # --- Status message depending on limits ---
+        if has_limits(rows[0]):
+            self.show_status("✅ Found with Limits")
+        else:
+            # Amber for "no limit" warning
+            self.show_status("⚠️ Found with no Limit", color="#FFBF00")
+
+    def check_end_tests_batch(self, top_n):
+        # Check the top N (0 = all) fallout rows in one go; Save to Excel writes them as one table at H3
+        dataset = self.dataset_key()
+        if dataset is None:
+            return
 
-                # --- Status message depending on limits ---
-                if lolimit != "":
-                    self.show_status("✅ Found with Limits")
-                else:
-                    # Amber for "no limit" warning
-                    self.show_status("⚠️ Found with no Limit", color="#FFBF00")
-            else:
-                self.show_status("\n❌ No End Test No. found in the TESTNO Column", color="#d32f2f")
+        label = "all" if top_n == 0 else f"top {top_n}"
+        self.show_status(f"\n🔍Checking {label} End Test Nos.")
 
+        try:
+            key = (dataset, self.preview_mark, "end_test", top_n)
+            checked = self.results.get(key)
+            if checked is None:
+                checked = check_end_tests(self.layout, self.fallout_table, top_n)
+                self.results.put(key, checked)
         except Exception as e:
             self.show_status(f"\n❌ Error checking End Test No: {e}", color="#d32f2f")
+            return
+
+        if not checked:
+            self.show_status("\n❌ No End Test No. found in the fallout table", color="#d32f2f")
+            return
+        self.end_test_rows = checked
+        self.end_test_top_n = top_n
+
+        # --- Show combined reference table in status box ---
+        lines = [
+            "\nEnd Test No. Reference:",
+            f"{'TSNO':<10}{'TESTNO':<10}{'COMMENT':<15}{'MODE':<10}{'HILIMIT':<10}{'LOLIMIT':<10}{'STATUS'}",
+            "-" * 80,
+        ]
+        for tsno, testno, comment, mode, hilimit, lolimit, status in checked:
+            lines.append(f"{tsno:<10}{testno:<10}{comment:<15}{mode:<10}{hilimit:<10}{lolimit:<10}{status}")
+        self.show_status("\n".join(lines))
+
+        with_limits = sum(1 for row in checked if row[-1] == STATUS_LIMITS)
+        no_limit = sum(1 for row in checked if row[-1] == STATUS_NO_LIMIT)
+        not_found = len(checked) - with_limits - no_limit
+        color = "#d32f2f" if not_found else "#FFBF00" if no_limit else None
+        self.show_status(
+            f"✅ {with_limits} with Limits, ⚠️ {no_limit} with no Limit, ❌ {not_found} not found",
+            color=color
+        )
+
+    # --- Background jobs ---
+    def run_job(self, job, on_done, error_prefix, timer=None):
+        # Run job() on a worker thread; on_done(result) runs back on the Tk thread.
+        # With a RunTimer, its summary line is shown and the run is logged when the job ends
+        if self.job_running:
+            self.show_status("⚠️ Please wait for the current job to finish.", color="#FFBF00")
+            return
+
+        self.job_running = True
+        self.job_timer = timer
+        self.cancel_event.clear()
+        self.progress_var.set(0)
+        self.set_busy(True)
+
+        self.worker_jobs.put((job, on_done, error_prefix))
+        self.root.after(100, self.poll_job_queue)
+
+    def worker_loop(self):
+        # Worker thread: run jobs one at a time, report back through job_queue
+        while True:
+            job, on_done, error_prefix = self.worker_jobs.get()
+            if job is None:
+                return
+            try:
+                self.job_queue.put(("done", on_done, job()))
+            except ConversionCancelled:
+                self.job_queue.put(("cancelled", None, None))
+            except Exception as e:
+                self.job_queue.put(("error", error_prefix, e))
+
+    def poll_job_queue(self):
+        # Drain worker messages; keep polling until the job reports back
+        try:
+            while True:
+                kind, handler, payload = self.job_queue.get_nowait()
+                if kind == "progress":
+                    self.progress_var.set(payload)
+                    continue
+
+                self.job_running = False
+                self.set_busy(False)
+                timer = self.job_timer
+                if kind == "done":
+                    self.progress_var.set(100)
+                    handler(payload)
+                    if timer:
+                        self.show_status(timer.summary())
+                        timer.append_log("ok")
+                elif kind == "cancelled":
+                    self.progress_var.set(0)
+                    self.show_status("⚠️ Conversion cancelled.", color="#FFBF00")
+                    if timer:
+                        timer.append_log("cancelled")
+                else:
+                    self.show_status(f"{handler}: {payload}", color="#d32f2f")
+                    if timer:
+                        timer.append_log("error", payload)
+                return
+        except queue.Empty:
+            pass
+        self.root.after(100, self.poll_job_queue)
+
+    def report_progress(self, bytes_read, total_bytes):
+        # Called from the worker thread — only hands the value to the queue
+        percent = bytes_read * 100 / total_bytes if total_bytes else 100
+        self.job_queue.put(("progress", None, percent))
+
+    def cancel_job(self):
+        if self.job_running:
+            self.cancel_event.set()
+            self.show_status("ℹ️ Cancelling…")
+
+    def set_busy(self, busy):
+        state = "disabled" if busy else "normal"
+        for btn in self.action_buttons:
+            btn.config(state=state)
+        self.cancel_btn.config(state="normal" if busy else "disabled")
+
+    def close(self):
+        # Quit the hidden Excel (on the worker thread that owns it), then close the window
+        stopped = threading.Event()
+        self.cancel_event.set()
+
+        def shutdown():
+            if self.excel is not None:
+                self.excel.close()
+            stopped.set()
+
+        if self.worker.is_alive():
+            self.worker_jobs.put((shutdown, lambda _: None, ""))
+            self.worker_jobs.put((None, None, None))
+            stopped.wait(timeout=10)
+
+        if self.status_log:
+            self.status_log.close()
+        self.root.destroy()
 
-        finally:
-            if wb_xlw:
-                try:
-                    wb_xlw.close()
-                except:
-                    pass
-            if app:
-                try:
-                    app.quit()
-                except:
-                    pass
     def clear_all(self):
         # Reset file path
         self.path_var.set("")
@@ -578,6 +922,12 @@ class AutomatingDeliverables:
             self.filter_var.set("")                 # clear current selection
             self.filter_dropdown['values'] = []     # empty the dropdown list
 
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_backend("file")
+        return self._backend
+
 # --- Run the App ---
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,214 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from deliverables_cache import DatasetCache
+from deliverables_core import build_lot_fallout_table, get_backend, is_export_dir, lot_counts, process_file
+
+# Deliverables Automation Tool — headless batch runner
+# Author: Rose Anne Lafuente
+# Description: Runs the convert → fallout → End Test check pipeline over many
+# tester CSVs on a process pool, without Tk or Excel.
+#
+# Usage:
+#   python deliverables_batch.py <folder | glob> [...] [--workers N] [--mark C1_MARK]
+#                                [--top-n N] [--out-dir DIR] [--no-xlsx] [--no-cache]
+#                                [--export csv jsonl columnar] [--summary run_summary.json]
+#   python deliverables_batch.py <folder | glob> [...] --aggregate lots.xlsx [--mark C1_MARK]
+
+
+def collect_csv_files(patterns):
+    """Expand folders and glob patterns into a sorted, de-duplicated list of CSVs.
+
+    Tables exported by an earlier run are skipped: those in a <name>_export/
+    folder beside <name>.xlsx or <name>.csv (see deliverables_core.is_export_dir).
+    """
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "*.csv"))
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        files.extend(
+            os.path.abspath(m) for m in sorted(matches)
+            if m.lower().endswith(".csv") and not is_export_dir(os.path.dirname(os.path.abspath(m)))
+        )
+    return list(dict.fromkeys(files))
+
+
+def run_batch(files, workers=None, mark=None, out_dir=None, top_n=1, cache=None,
+              write_xlsx=True, exports=(), on_result=None):
+    """Process every file and return the run summary dict.
+
+    workers=None uses all cores; workers=1 runs in-process (handy for
+    debugging). top_n is how many End Test Nos. to check per fallout table
+    (0 = all). cache is an optional DatasetCache shared by the workers.
+    With write_xlsx=False the files are taken one at a time and the pool is
+    used inside each file instead (parse_parallel), which suits a few huge
+    logs better than one process per file.
+    exports lists the plain formats (see deliverables_export) written per file.
+    on_result(result) is called as each file finishes.
+    """
+    started = datetime.now().isoformat(timespec="seconds")
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+
+    results = []
+    if not write_xlsx:
+        for file_path in files:
+            result = process_file(file_path, mark, out_dir, top_n, cache,
+                                  write_xlsx=False, parse_workers=workers, exports=exports)
+            results.append(result)
+            if on_result:
+                on_result(result)
+    elif workers == 1 or len(files) <= 1:
+        for file_path in files:
+            result = process_file(file_path, mark, out_dir, top_n, cache, exports=exports)
+            results.append(result)
+            if on_result:
+                on_result(result)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+            futures = [pool.submit(process_file, file_path, mark, out_dir, top_n, cache, exports=exports) for file_path in files]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+    # Keep the summary in input order, not completion order
+    order = {file_path: i for i, file_path in enumerate(files)}
+    results.sort(key=lambda r: order.get(r["file"], len(order)))
+
+    return {
+        "started": started,
+        "seconds": round(time.perf_counter() - start, 3),
+        "workers": workers,
+        "mark": mark,
+        "top_n": top_n,
+        "xlsx": write_xlsx,
+        "exports": list(exports),
+        "files": len(results),
+        "ok": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] != "ok"),
+        "results": results,
+    }
+
+
+def run_aggregate(files, workers=None, mark=None, cache=None, out_file=None, on_result=None):
+    """One fallout pareto across many lots.
+
+    Map: each CSV is parsed once on the process pool into its (C1_MARK, ET)
+    counts and THEORETICAL_NUM. Reduce: the counts are merged into one table
+    with a column per lot and the overall fallout % weighted by theoretical
+    count (see build_lot_fallout_table), saved to out_file if given.
+    Returns the run summary dict.
+    """
+    started = datetime.now().isoformat(timespec="seconds")
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+
+    lots = []
+    if workers == 1 or len(files) <= 1:
+        for file_path in files:
+            lots.append(lot_counts(file_path, cache))
+            if on_result:
+                on_result(lots[-1])
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+            for lot in pool.map(lot_counts, files, [cache] * len(files)):
+                lots.append(lot)
+                if on_result:
+                    on_result(lot)
+
+    header, rows = build_lot_fallout_table(lots, mark)
+    if out_file:
+        get_backend().write_lot_table(out_file, header, rows)
+
+    return {
+        "started": started,
+        "seconds": round(time.perf_counter() - start, 3),
+        "workers": workers,
+        "mark": mark,
+        "files": len(lots),
+        "ok": sum(1 for lot in lots if "error" not in lot),
+        "failed": sum(1 for lot in lots if "error" in lot),
+        "out_file": out_file,
+        "lots": [{k: v for k, v in lot.items() if k != "counts"} for lot in lots],
+        "header": header,
+        "rows": rows,
+    }
+
+
+def print_lot(lot):
+    if "error" in lot:
+        print(f"[error] {lot['file']}: {lot['error']}")
+    else:
+        print(f"[ok]    {lot['file']} ({lot['rows']:,} rows, THEORETICAL_NUM {lot['theoretical_num']})")
+
+
+def print_result(result):
+    if result["status"] == "ok":
+        cached = ", cached" if result.get("from_cache") else ""
+        exported = f"{len(result['exports'])} export files" if result.get("exports") else "summary only"
+        target = result["out_file"] or exported
+        print(f"[ok]    {result['file']} → {target} ({result['rows']:,} rows{cached}, {result['seconds']:.2f}s)")
+    else:
+        print(f"[error] {result['file']}: {result['error']}")
+
+
+def main(argv=None):
+    # Only the command line needs the format list; run_batch imports the module on demand
+    from deliverables_export import EXPORT_FORMATS
+
+    parser = argparse.ArgumentParser(description="Batch CSV → Excel deliverables without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="folders or glob patterns of tester CSVs")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--mark", default=None, help="only build the Pivot sheet for this C1_MARK (default: all marks)")
+    parser.add_argument("--top-n", type=int, default=1, help="End Test Nos. to check per fallout table (0 = all)")
+    parser.add_argument("--out-dir", default=None, help="write the .xlsx files here instead of next to each CSV")
+    parser.add_argument("--no-xlsx", action="store_true",
+                        help="only parse and report (fallout tables go into the summary); huge files are split across workers")
+    parser.add_argument("--export", nargs="+", default=[], choices=EXPORT_FORMATS, metavar="FORMAT",
+                        help=f"also write the fallout / End Test / count tables as {', '.join(EXPORT_FORMATS)}")
+    parser.add_argument("--no-cache", action="store_true", help="always re-parse, don't use the dataset cache")
+    parser.add_argument("--cache-dir", default=None, help="dataset cache folder (default: ~/.deliverables_cache)")
+    parser.add_argument("--summary", default="run_summary.json", help="where to write the JSON run summary")
+    parser.add_argument("--aggregate", default=None, metavar="XLSX",
+                        help="instead of one workbook per CSV, write one combined fallout table across all lots here")
+    args = parser.parse_args(argv)
+
+    files = collect_csv_files(args.inputs)
+    if not files:
+        print("No CSV files found.", file=sys.stderr)
+        return 2
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    cache = None if args.no_cache else DatasetCache(args.cache_dir)
+
+    if args.aggregate:
+        summary = run_aggregate(files, args.workers, args.mark, cache, args.aggregate, on_result=print_lot)
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\n{summary['ok']}/{summary['files']} lots merged in {summary['seconds']:.2f}s → {args.aggregate}"
+              f" — summary: {args.summary}")
+        return 0 if summary["failed"] == 0 else 1
+
+    summary = run_batch(files, args.workers, args.mark, args.out_dir, args.top_n, cache,
+                        write_xlsx=not args.no_xlsx, exports=args.export, on_result=print_result)
+
+    with open(args.summary, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\n{summary['ok']}/{summary['files']} files OK in {summary['seconds']:.2f}s — summary: {args.summary}")
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+import argparse
+import csv
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from deliverables_cache import DatasetCache
+from deliverables_core import (
+    build_fallout_table,
+    check_end_tests,
+    parse_csv,
+    parse_parallel,
+    stream_csv_to_xlsx,
+)
+from deliverables_timing import peak_rss_mb
+
+# Deliverables Automation Tool — synthetic logs and benchmarks
+# Author: Rose Anne Lafuente
+# Description: Generates tester CSVs with the layout the tool expects (no
+# production data needed) and times each processing stage separately.
+#
+# Usage:
+#   python deliverables_bench.py generate out.csv --rows 100000 --marks 4 --et-spread 20
+#   python deliverables_bench.py run --rows 10000 100000 1000000 [--json bench.json]
+#   python deliverables_bench.py startup [--budget-ms 250]
+
+# Excel cannot hold more rows than this, so the xlsx stage is skipped above it
+EXCEL_MAX_ROWS = 1048576
+
+STAGES = ["parse", "parse_parallel", "xlsx", "fallout", "end_test"]
+# Stages that start from parsed counts: those come from a dataset cache in
+# the data folder, filled by another process, so the parse is not measured
+COUNTS_STAGES = ("fallout", "end_test")
+
+# Cold start: time to a usable entry point in a fresh interpreter, and the
+# heavy modules it must not pull in at startup. For the GUI that is the
+# import plus building its window (hidden), when a display is available.
+STARTUP_BUDGET_MS = 250
+STARTUP_ENTRY_POINTS = {
+    "deliverables_core": ["openpyxl", "xlwings"],
+    "deliverables_batch": ["openpyxl", "xlwings"],
+    "Automating Deliverables.py": ["openpyxl", "xlwings"],
+}
+STARTUP_APPS = {"Automating Deliverables.py": "AutomatingDeliverables"}
+
+_STARTUP_PROBE = '''
+import importlib.util, json, sys, time
+target, app, heavy = sys.argv[1], sys.argv[2], sys.argv[3:]
+start = time.perf_counter()
+if target.endswith(".py"):
+    spec = importlib.util.spec_from_file_location("startup_probe", target)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+else:
+    module = __import__(target)
+built = None
+if app != "-":
+    import tkinter
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        built = False       # no display: import time only
+    else:
+        root.withdraw()
+        getattr(module, app)(root)
+        root.update_idletasks()
+        root.destroy()
+        built = True
+ms = (time.perf_counter() - start) * 1000
+print(json.dumps({"ms": ms, "built": built, "loaded": [m for m in heavy if m in sys.modules]}))
+'''
+
+
+def generate_csv(path, rows=10000, marks=4, et_spread=20, tests=None, measurements=8,
+                 fail_rate=0.3, theoretical=None, seed=0):
+    """Write a synthetic tester log.
+
+    Layout (the same anchors the tool looks for):
+    - THEORETICAL_NUM in Column A, its value in Column C
+    - TSNO/TESTNO/COMMENT/MODE/HILIMIT/LOLIMIT table with LOLIMIT in Column F
+    - data header DIE, X, Y, SITE, HBIN, SBIN, C1_MARK (Column G), FT, ET and
+      one measurement column per test (named by TESTNO), then the data rows
+
+    et_spread End Test Nos. appear in ET, the first ones far more often
+    (a pareto-like fallout). Every 5th test has no limits. A failing die
+    passes every test before its ET, fails its ET and has no readings after
+    it, like a tester that stops at the first fail.
+    """
+    rng = random.Random(seed)
+    tests = max(tests or et_spread, et_spread, measurements)
+    theoretical = rows if theoretical is None else theoretical
+
+    # --- Reference table ---
+    reference = []
+    for i in range(1, tests + 1):
+        has_limits = i % 5 != 0
+        lo, hi = (round(0.5 * i, 3), round(0.5 * i + 1.0, 3)) if has_limits else ("", "")
+        reference.append([i, 1000 + 10 * i, f"TEST_{i}", "V" if i % 2 else "I", hi, lo])
+
+    mark_names = [f"M{chr(65 + i % 26)}{i // 26 + 1}" for i in range(marks)]
+    et_weights = [1.0 / k for k in range(1, et_spread + 1)]
+    et_choices = list(range(et_spread))
+    n_meas = min(measurements, tests)
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["THEORETICAL_NUM", "", theoretical])
+        w.writerow(["LOT_ID", "", f"SYNTH{seed:04d}"])
+        w.writerow([])
+        w.writerow(["TSNO", "TESTNO", "COMMENT", "MODE", "HILIMIT", "LOLIMIT"])
+        w.writerows(reference)
+        w.writerow([])
+        w.writerow(["DIE", "X", "Y", "SITE", "HBIN", "SBIN", "C1_MARK", "FT", "ET"]
+                   + [str(ref[1]) for ref in reference[:n_meas]])
+
+        for die in range(rows):
+            fail_at = rng.choices(et_choices, et_weights)[0] if rng.random() < fail_rate else None
+            readings = []
+            for t in range(n_meas):
+                _, _, _, _, hi, lo = reference[t]
+                if fail_at is not None and t > fail_at:
+                    readings.append("")
+                elif lo == "":
+                    readings.append(f"{rng.uniform(0, 5):.4f}")
+                elif fail_at == t:
+                    readings.append(f"{hi + rng.uniform(0.01, 1):.4f}")
+                else:
+                    readings.append(f"{rng.uniform(lo, hi):.4f}")
+
+            if fail_at is None:
+                bins, ft, et = [1, 1], "", ""
+            else:
+                bins, ft, et = [2, 10 + fail_at], 10 + fail_at, reference[fail_at][1]
+            w.writerow([die, die % 200, die // 200, die % 4] + bins
+                       + [rng.choice(mark_names), ft, et] + readings)
+
+    return path
+
+
+def _cache_counts(csv_path, cache_dir):
+    cache = DatasetCache(cache_dir)
+    if cache.get(csv_path) is None:
+        cache.put(csv_path, *parse_csv(csv_path))
+
+
+def _run_stage(stage, csv_path, workers, cache_dir=None):
+    # Runs in a fresh process so the peak memory belongs to this stage alone
+    rows = None
+    peak_valid = True
+    if stage in COUNTS_STAGES:
+        cached = DatasetCache(cache_dir).get(csv_path)
+        if cached is None:
+            # Cache not writable: parse here, so the peak would be the parse's
+            cached, peak_valid = parse_csv(csv_path), False
+        layout, counts, rows = cached
+        grouped = counts.by_mark()
+
+    start = time.perf_counter()
+    if stage == "parse":
+        _, _, rows = parse_csv(csv_path)
+    elif stage == "parse_parallel":
+        _, _, rows = parse_parallel(csv_path, workers)
+    elif stage == "xlsx":
+        out_file = os.path.splitext(csv_path)[0] + ".xlsx"
+        _, _, rows, _ = stream_csv_to_xlsx(csv_path, out_file, "bench")
+        os.remove(out_file)
+    elif stage == "fallout":
+        for mark in layout.c1_marks:
+            build_fallout_table(grouped.get(mark, {}), layout.theoretical_num)
+    elif stage == "end_test":
+        for mark in layout.c1_marks:
+            fallout_table = build_fallout_table(grouped.get(mark, {}), layout.theoretical_num)
+            check_end_tests(layout, fallout_table, top_n=0)
+    seconds = time.perf_counter() - start
+
+    return {"stage": stage, "seconds": seconds, "rows": rows, "peak_rss_mb": peak_rss_mb() if peak_valid else None}
+
+
+def run_benchmarks(row_counts, data_dir, workers=None, stages=STAGES, seed=0, **gen_options):
+    """Time every stage at every size; returns a list of result dicts."""
+    results = []
+    cache_dir = os.path.join(data_dir, "cache")
+    for rows in row_counts:
+        csv_path = os.path.join(data_dir, f"bench_{rows}_{seed}.csv")
+        if not os.path.exists(csv_path):
+            print(f"Generating {rows:,} rows → {csv_path}")
+            generate_csv(csv_path, rows=rows, seed=seed, **gen_options)
+        size_mb = os.path.getsize(csv_path) / (1024 * 1024)
+
+        for stage in stages:
+            if stage == "xlsx" and rows > EXCEL_MAX_ROWS:
+                print(f"{rows:>12,}  {stage:<15} skipped (over Excel's {EXCEL_MAX_ROWS:,} row limit)")
+                continue
+
+            if stage in COUNTS_STAGES:
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    pool.submit(_cache_counts, csv_path, cache_dir).result()
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(_run_stage, stage, csv_path, workers, cache_dir).result()
+
+            seconds = result["seconds"]
+            result.update(
+                size_rows=rows,
+                file_mb=round(size_mb, 1),
+                rows_per_sec=round(rows / seconds) if seconds > 0 else None,
+                mb_per_sec=round(size_mb / seconds, 1) if seconds > 0 and stage in ("parse", "parse_parallel", "xlsx") else None,
+                seconds=round(seconds, 4),
+            )
+            results.append(result)
+            print_result(result)
+    return results
+
+
+def measure_startup(budget_ms=STARTUP_BUDGET_MS, repeat=3):
+    """Best-of-N cold start time per entry point (see _STARTUP_PROBE); returns (results, all_ok)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for target, heavy in STARTUP_ENTRY_POINTS.items():
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run(
+                [sys.executable, "-c", _STARTUP_PROBE, target, STARTUP_APPS.get(target, "-")] + heavy,
+                cwd=here, capture_output=True, text=True, check=True
+            )
+            runs.append(json.loads(out.stdout))
+        best = min(runs, key=lambda r: r["ms"])
+        ok = best["ms"] <= budget_ms and not best["loaded"]
+        results.append({"entry": target, "ms": round(best["ms"], 1), "built": best["built"],
+                        "loaded": best["loaded"], "ok": ok})
+    return results, all(r["ok"] for r in results)
+
+
+def print_result(result):
+    rate = f"{result['rows_per_sec']:>12,} rows/s" if result["rows_per_sec"] else " " * 19
+    mbps = f"{result['mb_per_sec']:>7} MB/s" if result["mb_per_sec"] else " " * 12
+    peak = f"{result['peak_rss_mb']:>8} MB peak" if result["peak_rss_mb"] is not None else ""
+    print(f"{result['size_rows']:>12,}  {result['stage']:<15}{result['seconds']:>10.3f}s {rate} {mbps} {peak}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic tester logs and per-stage benchmarks.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_layout_options(p):
+        p.add_argument("--marks", type=int, default=4, help="number of C1_MARK values")
+        p.add_argument("--et-spread", type=int, default=20, help="number of distinct End Test Nos. in ET")
+        p.add_argument("--measurements", type=int, default=8, help="measurement columns per row")
+        p.add_argument("--fail-rate", type=float, default=0.3, help="fraction of failing dies")
+        p.add_argument("--seed", type=int, default=0)
+
+    gen = sub.add_parser("generate", help="write one synthetic tester CSV")
+    gen.add_argument("out", help="CSV file to write")
+    gen.add_argument("--rows", type=int, default=10000)
+    add_layout_options(gen)
+
+    run = sub.add_parser("run", help="time each stage at several sizes")
+    run.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    run.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    run.add_argument("--workers", type=int, default=None, help="workers for parse_parallel (default: all cores)")
+    run.add_argument("--data-dir", default=None, help="keep generated CSVs here and reuse them (default: temp folder)")
+    run.add_argument("--json", default=None, help="also write the results to this JSON file")
+    add_layout_options(run)
+
+    startup = sub.add_parser("startup", help="check cold-start import time against a budget")
+    startup.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+
+    args = parser.parse_args(argv)
+    if args.command == "startup":
+        results, ok = measure_startup(args.budget_ms)
+        for r in results:
+            loaded = f"  (loaded {', '.join(r['loaded'])})" if r["loaded"] else ""
+            built = {True: "  (window built)", False: "  (no display: import only)"}.get(r["built"], "")
+            print(f"{'ok  ' if r['ok'] else 'FAIL'}  {r['entry']:<30}{r['ms']:>8.1f} ms{built}{loaded}")
+        print(f"Budget: {args.budget_ms:.0f} ms per entry point, no openpyxl / xlwings at startup")
+        return 0 if ok else 1
+
+    gen_options = dict(marks=args.marks, et_spread=args.et_spread, measurements=args.measurements,
+                       fail_rate=args.fail_rate)
+
+    if args.command == "generate":
+        start = time.perf_counter()
+        generate_csv(args.out, rows=args.rows, seed=args.seed, **gen_options)
+        print(f"Wrote {args.rows:,} rows to {args.out} in {time.perf_counter() - start:.1f}s")
+        return 0
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="deliverables_bench_")
+    os.makedirs(data_dir, exist_ok=True)
+    print(f"{'rows':>12}  {'stage':<15}{'time':>11} {'throughput':>19} {'':>12} memory")
+    results = run_benchmarks(args.rows, data_dir, args.workers, args.stages, args.seed, **gen_options)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"workers": args.workers, "options": gen_options, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import zlib
+from array import array
+from collections import OrderedDict
+
+from deliverables_core import FalloutCounts, LayoutIndex
+
+# Deliverables Automation Tool — parsed-dataset cache
+# Author: Rose Anne Lafuente
+# Description: Keeps the parsed result of a CSV (layout index + (C1_MARK, ET)
+# counts) on disk, so converting a file we already processed takes
+# milliseconds instead of a full parse.
+#
+# Each entry is one file named after the CSV fingerprint (path, size, mtime
+# and a content hash). Entries are compact binary: a JSON header with the
+# layout and a symbol table, followed by the counts as typed columns
+# (mark id, ET id, count), all zlib-compressed. Least recently used entries
+# are evicted once the folder goes over its size cap.
+#
+# ResultCache is the in-memory counterpart for what is computed from a parsed
+# CSV (fallout tables, End Test rows), so the GUI can flip between C1_MARKs
+# without recomputing.
+
+CACHE_VERSION = 1
+MAGIC = b"DDC1"
+CACHE_EXT = ".ddc"
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "DELIVERABLES_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".deliverables_cache")
+)
+DEFAULT_MAX_BYTES = int(os.environ.get("DELIVERABLES_CACHE_MB", "256")) * 1024 * 1024
+
+# Files bigger than 3 samples are hashed on their head, middle and tail only,
+# so fingerprinting a multi-GB log stays in the millisecond range
+SAMPLE_BYTES = 1024 * 1024
+
+# Results kept in memory per ResultCache (a fallout table is a few KB)
+DEFAULT_MAX_RESULTS = 256
+
+
+def content_hash(file_path, full=False):
+    """blake2b of the file contents (sampled for big files unless full=True)."""
+    h = hashlib.blake2b(digest_size=16)
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        if full or size <= 3 * SAMPLE_BYTES:
+            for chunk in iter(lambda: f.read(SAMPLE_BYTES), b""):
+                h.update(chunk)
+        else:
+            for offset in (0, (size - SAMPLE_BYTES) // 2, size - SAMPLE_BYTES):
+                f.seek(offset)
+                h.update(f.read(SAMPLE_BYTES))
+    return h.hexdigest()
+
+
+def file_fingerprint(file_path, full_hash=False):
+    """Cache key for a CSV: path, size, mtime and content hash together."""
+    st = os.stat(file_path)
+    path = os.path.normcase(os.path.abspath(file_path))
+    key = f"{path}|{st.st_size}|{st.st_mtime_ns}|{content_hash(file_path, full_hash)}"
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def encode_dataset(layout, counts, row_count):
+    # Counts as three columns over a shared string table
+    symbols = {}
+    mark_ids, et_ids, values = array("I"), array("I"), array("Q")
+    for (mark, et), n in counts.counts.items():
+        mark_ids.append(symbols.setdefault(mark, len(symbols)))
+        et_ids.append(symbols.setdefault(et, len(symbols)))
+        values.append(n)
+
+    header = json.dumps({
+        "version": CACHE_VERSION,
+        "row_count": row_count,
+        "layout": layout.to_state(),
+        "symbols": list(symbols),
+        "n": len(values),
+    }).encode("utf-8")
+
+    body = struct.pack("<I", len(header)) + header + mark_ids.tobytes() + et_ids.tobytes() + values.tobytes()
+    return MAGIC + zlib.compress(body, 6)
+
+
+def decode_dataset(data):
+    """Inverse of encode_dataset; returns (layout, counts, row_count)."""
+    if data[:4] != MAGIC:
+        raise ValueError("Not a dataset cache file")
+    body = zlib.decompress(data[4:])
+
+    (header_len,) = struct.unpack_from("<I", body)
+    header = json.loads(body[4:4 + header_len].decode("utf-8"))
+    if header.get("version") != CACHE_VERSION:
+        raise ValueError("Dataset cache version mismatch")
+
+    n = header["n"]
+    offset = 4 + header_len
+    columns = []
+    for typecode in ("I", "I", "Q"):
+        column = array(typecode)
+        size = n * column.itemsize
+        column.frombytes(body[offset:offset + size])
+        offset += size
+        columns.append(column)
+
+    symbols = header["symbols"]
+    counts = FalloutCounts()
+    for mark_id, et_id, value in zip(*columns):
+        counts.counts[(symbols[mark_id], symbols[et_id])] = value
+
+    return LayoutIndex.from_state(header["layout"]), counts, header["row_count"]
+
+
+class DatasetCache:
+    """Folder of encoded datasets keyed by CSV fingerprint, with LRU eviction.
+
+    The file modification time is the LRU clock: a hit touches the entry,
+    eviction removes the oldest entries first. Needs no index file, so
+    several worker processes can share one folder.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_EXT)
+
+    def get(self, file_path):
+        """(layout, counts, row_count) for this CSV, or None on a miss."""
+        try:
+            path = self.path_for(file_fingerprint(file_path))
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        try:
+            dataset = decode_dataset(data)
+        except Exception:
+            # Corrupt or old-format entry: drop it and treat as a miss
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path)   # mark as recently used
+        except OSError:
+            pass
+        return dataset
+
+    def put(self, file_path, layout, counts, row_count):
+        # Caching is best effort; a full disk must not fail the conversion
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self.path_for(file_fingerprint(file_path))
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(encode_dataset(layout, counts, row_count))
+            os.replace(tmp_path, path)
+            self.evict()
+        except OSError:
+            pass
+
+    def entries(self):
+        # [(last used, size, path)] oldest first
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return []
+        entries = []
+        for name in names:
+            if name.endswith(CACHE_EXT):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ResultCache:
+    """In-memory LRU of results computed from one version of a parsed CSV.
+
+    Keys are tuples whose first item identifies the dataset, e.g.
+    ((csv path, AppendState.fingerprint), C1_MARK, "fallout"). At most
+    max_entries results are kept, the least recently used go first.
+    invalidate(dataset) drops everything computed from that version.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_RESULTS):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """The stored result, or None on a miss."""
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, dataset):
+        for key in [key for key in self.entries if key[0] == dataset]:
+            del self.entries[key]
@@ -0,0 +1,1385 @@
+import copy
+import csv
+import hashlib
+import io
+import mmap
+import os
+import re
+import time
+from array import array
+from collections import Counter
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+from deliverables_timing import span
+
+# Deliverables Automation Tool — processing core
+# Author: Rose Anne Lafuente
+# Description: CSV → Excel conversion, layout index, fallout tables and
+# End Test checks without any GUI, so it can run headless and in worker
+# processes. The Tk app and the batch runner both build on this module.
+
+__version__ = "2.0.0"
+
+NAN = float("nan")
+
+# Rows are converted in blocks of this size; progress / cancel are checked per block
+BLOCK_ROWS = 2000
+
+# Values looked at to guess a column's type within a block
+TYPE_SAMPLE = 64
+
+# Loose version of the float() grammar: everything float() accepts matches,
+# so a text column with no match can skip conversion entirely
+NUMBER_LIKE = re.compile(
+    r"\s*[+-]?(?:(?:\d[\d_]*)?\.\d[\d_]*|\d[\d_]*\.?)(?:[eE][+-]?\d[\d_]*)?\s*"
+    r"|\s*[+-]?(?:inf|infinity|nan)\s*",
+    re.IGNORECASE
+)
+
+
+class ConversionCancelled(Exception):
+    """Raised when a conversion is stopped through its cancel event."""
+
+
+class WorkbookNotAppendable(Exception):
+    """Raised when a data workbook can't be updated in place (it was not written by this tool)."""
+
+
+def convert_cell(value):
+    # Same typing rules as the original cell-by-cell conversion:
+    # digits → int, anything float() accepts → float, otherwise keep the text
+    try:
+        if value.isdigit():
+            return int(value)
+        return float(value)
+    except ValueError:
+        return value
+
+
+def infer_column_type(sample):
+    # "int", "float", "text" or "mixed" from a few non-empty values
+    if not sample:
+        return "text"
+    if all(map(str.isdigit, sample)):
+        return "int"
+    if any(map(str.isdigit, sample)):
+        return "mixed"
+    if all(map(NUMBER_LIKE.fullmatch, sample)):
+        return "float"
+    if not any(map(NUMBER_LIKE.fullmatch, sample)):
+        return "text"
+    return "mixed"
+
+
+def _convert_dense(values, kind):
+    # Bulk conversion of non-empty values; None if the column doesn't fit its type
+    try:
+        if kind == "int":
+            if all(map(str.isdigit, values)):
+                return list(map(int, values))
+        elif kind == "float":
+            if not any(map(str.isdigit, values)):
+                return list(map(float, values))
+        elif kind == "text":
+            if not any(map(NUMBER_LIKE.fullmatch, values)):
+                return list(values)
+    except ValueError:
+        pass
+    return None
+
+
+def convert_column(values):
+    """Convert one column of CSV text; same result as convert_cell on every value.
+
+    The type is guessed from a sample, then the whole column is converted
+    with a single map() call instead of a try/except per cell. Columns that
+    turn out mixed fall back to convert_cell. Empty cells stay "".
+    """
+    if "" in values:
+        filled = [i for i, v in enumerate(values) if v]
+        dense = [values[i] for i in filled]
+    else:
+        filled = None
+        dense = values
+
+    kind = infer_column_type(dense[:TYPE_SAMPLE])
+    converted = _convert_dense(dense, kind) if kind != "mixed" else None
+    if converted is None:
+        converted = [convert_cell(v) for v in dense]
+
+    if filled is None:
+        return converted
+    out = [""] * len(values)
+    for i, v in zip(filled, converted):
+        out[i] = v
+    return out
+
+
+def convert_rows(rows):
+    """Convert a block of CSV rows column by column.
+
+    Blocks where the rows have different lengths (the header area) are
+    converted row by row instead.
+    """
+    if not rows:
+        return []
+    if len(set(map(len, rows))) != 1 or not rows[0]:
+        return [[convert_cell(value) for value in row] for row in rows]
+
+    columns = [convert_column(list(column)) for column in zip(*rows)]
+    return [list(row) for row in zip(*columns)]
+
+
+def is_blank(value):
+    return value is None or value == ""
+
+
+def normalize_label(value):
+    # Show whole numbers without ".0" (e.g. End Test No. 1010.0 → "1010")
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+class LayoutIndex:
+    """Positions of the anchors in the converted sheet, recorded during the CSV pass.
+
+    Row and column numbers are 1-based so they can be used directly as Excel
+    coordinates. Mirrors the lookups the Excel steps used to do:
+    - THEORETICAL_NUM: first match in Column A, value two columns to the right
+    - Reference table: first non-empty cell in Column F must be LOLIMIT, the
+      table runs down from there until Column A is empty
+    - Data block: first non-empty cell in Column G must be C1_MARK, the block
+      runs down from there until Column G is empty
+    """
+
+    def __init__(self):
+        self.theoretical_row = None
+        self.theoretical_num = None
+
+        self.lolimit_row = None   # TSNO…LOLIMIT header row
+        self.ref_last_row = None
+        self.ref_rows = []        # values of columns A–F below the header
+
+        self.c1_mark_row = None   # data block header row
+        self.data_last_row = None
+        self.columns = {}         # header name (upper case) → column number
+
+        self._f_seen = False
+        self._g_seen = False
+        self._in_ref = False
+        self._in_data = False
+        self._marks = {}          # dict keeps first-seen order
+        self._reference = None
+
+    @property
+    def et_col(self):
+        return self.columns.get("ET")
+
+    @property
+    def ft_col(self):
+        return self.columns.get("FT")
+
+    @property
+    def c1_marks(self):
+        return list(self._marks)
+
+    @property
+    def reference(self):
+        # Built on first use, then reused by every End Test check
+        if self._reference is None:
+            self._reference = ReferenceTable(self.ref_rows)
+        return self._reference
+
+    def to_state(self):
+        # Plain JSON-able snapshot (used by the dataset cache)
+        return {k: v for k, v in vars(self).items() if k != "_reference"}
+
+    @classmethod
+    def from_state(cls, state):
+        layout = cls()
+        layout.__dict__.update(state)
+        return layout
+
+    def observe(self, r_idx, values):
+        """Record one converted row; returns True if it is a data block row."""
+        col_a = values[0] if len(values) > 0 else None
+        col_f = values[5] if len(values) > 5 else None
+        col_g = values[6] if len(values) > 6 else None
+
+        # --- THEORETICAL_NUM in Column A ---
+        if self.theoretical_row is None and str(col_a).strip().upper() == "THEORETICAL_NUM":
+            self.theoretical_row = r_idx
+            self.theoretical_num = values[2] if len(values) > 2 else None
+
+        # --- Reference table below the LOLIMIT header ---
+        if self._in_ref:
+            if is_blank(col_a):
+                self._in_ref = False
+            else:
+                self.ref_rows.append((list(values[:6]) + [None] * 6)[:6])
+                self.ref_last_row = r_idx
+
+        if not self._f_seen and not is_blank(col_f):
+            self._f_seen = True
+            if str(col_f).strip().upper() == "LOLIMIT":
+                self.lolimit_row = r_idx
+                self.ref_last_row = r_idx
+                self._in_ref = True
+
+        # --- Data block below the C1_MARK header ---
+        is_data_row = False
+        if self._in_data:
+            if is_blank(col_g):
+                self._in_data = False
+            else:
+                is_data_row = True
+                self.data_last_row = r_idx
+                mark = normalize_label(col_g)
+                if mark:
+                    self._marks[mark] = None
+
+        if not self._g_seen and not is_blank(col_g):
+            self._g_seen = True
+            if str(col_g).strip().upper() == "C1_MARK":
+                self.c1_mark_row = r_idx
+                self.data_last_row = r_idx
+                self._in_data = True
+                for c_idx in range(6, len(values)):
+                    if is_blank(values[c_idx]):
+                        break
+                    self.columns.setdefault(str(values[c_idx]).strip().upper(), c_idx + 1)
+
+        return is_data_row
+
+
+class ReferenceTable:
+    """The TSNO…LOLIMIT rows keyed by normalized TESTNO for direct End Test lookups.
+
+    Values are kept as display strings. If a TESTNO appears twice the first
+    row wins, the same as searching the column top-down.
+    """
+
+    def __init__(self, ref_rows):
+        self.rows = {}
+        for row in ref_rows:
+            testno = normalize_label(row[1])
+            if testno and testno not in self.rows:
+                self.rows[testno] = ["" if v is None else str(v).strip() for v in row]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def lookup(self, end_test_no):
+        return self.rows.get(normalize_label(end_test_no))
+
+
+class FalloutCounts:
+    """Count of FT by (C1_MARK, ET) — the numbers the Excel PivotTable used to produce.
+
+    Like Excel's "Count of FT", rows with an empty FT cell are not counted.
+    Rows without an ET value are skipped as they have no End Test to report.
+    """
+
+    def __init__(self):
+        self.counts = {}   # (mark, et) → count
+
+    def add(self, mark, et, ft):
+        if is_blank(ft) or is_blank(et):
+            return
+        key = (normalize_label(mark), normalize_label(et))
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def add_row(self, layout, values):
+        # Pick C1_MARK / ET / FT out of a data block row
+        et_col, ft_col = layout.et_col, layout.ft_col
+        if not et_col or not ft_col:
+            return
+        self.add(
+            values[6],
+            values[et_col - 1] if len(values) >= et_col else None,
+            values[ft_col - 1] if len(values) >= ft_col else None,
+        )
+
+    def for_mark(self, mark):
+        return {et: n for (m, et), n in self.counts.items() if m == mark}
+
+    def by_mark(self):
+        # {mark: {et: count}} for every mark in one pass over the counts
+        grouped = {}
+        for (mark, et), n in self.counts.items():
+            grouped.setdefault(mark, {})[et] = n
+        return grouped
+
+
+class SymbolTable:
+    """Labels ↔ small integer codes; code 0 is always a blank cell (None or "").
+
+    A whitespace-only cell is not blank (FalloutCounts counts it), so it
+    gets a code of its own, with "" as its label.
+    """
+
+    def __init__(self):
+        self.labels = [""]
+        self.codes = {"": 0}
+
+    def encode(self, value):
+        if is_blank(value):
+            return 0
+        label = normalize_label(value)
+        key = label or None     # whitespace only
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def __len__(self):
+        return len(self.labels)
+
+
+class ColumnStore:
+    """The data block held column by column instead of as lists of boxed cells.
+
+    C1_MARK, ET and FT are dictionary-encoded: one array('I') of codes each,
+    into a symbol table shared by the three columns. Every other column of
+    the data header is an array('d') with NaN where the cell is blank or
+    text. A die costs 4 bytes per categorical and 8 per numeric column.
+    Built during parsing (parse_csv(..., store=...)); the columns are set up
+    at the C1_MARK header row, so a data block without rows gives empty ones.
+    """
+
+    CATEGORICAL = ("C1_MARK", "ET", "FT")
+
+    def __init__(self):
+        self.symbols = SymbolTable()
+        self.codes = {}       # categorical column name → array('I')
+        self.numeric = {}     # other header name → array('d')
+        self._positions = None
+
+    def start(self, layout):
+        # Column positions come from the C1_MARK header row
+        self._positions = []
+        for name, col in layout.columns.items():
+            if name in self.CATEGORICAL:
+                self.codes[name] = array("I")
+                self._positions.append((col - 1, self.codes[name], True))
+            else:
+                self.numeric[name] = array("d")
+                self._positions.append((col - 1, self.numeric[name], False))
+
+    def add_row(self, layout, values):
+        if self._positions is None:
+            self.start(layout)
+        n = len(values)
+        encode = self.symbols.encode
+        for idx, column, categorical in self._positions:
+            value = values[idx] if idx < n else None
+            if categorical:
+                column.append(encode(value))
+            else:
+                column.append(value if isinstance(value, (int, float)) else NAN)
+
+    def __len__(self):
+        marks = self.codes.get("C1_MARK")
+        return len(marks) if marks is not None else 0
+
+    @property
+    def nbytes(self):
+        columns = list(self.codes.values()) + list(self.numeric.values())
+        return sum(len(c) * c.itemsize for c in columns)
+
+    def fallout_counts(self):
+        """FalloutCounts from the code columns (same rules: blank FT or ET, code 0, is skipped)."""
+        counts = FalloutCounts()
+        if "ET" not in self.codes or "FT" not in self.codes:
+            return counts
+        pairs = Counter(
+            (mark, et)
+            for mark, et, ft in zip(self.codes["C1_MARK"], self.codes["ET"], self.codes["FT"])
+            if ft and et
+        )
+        labels = self.symbols.labels
+        for (mark, et), n in pairs.items():
+            counts.counts[(labels[mark], labels[et])] = n
+        return counts
+
+
+def pivot_sort_key(label):
+    # PivotTable row order: numbers ascending first, then text A→Z
+    try:
+        return (0, float(label), "")
+    except ValueError:
+        return (1, 0.0, label.lower())
+
+
+def theoretical_value(theoretical_num):
+    # THEORETICAL_NUM as a number, None if missing or not numeric
+    try:
+        return float(theoretical_num) if theoretical_num not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def build_fallout_table(et_counts, theoretical_num):
+    """Rows of [End Test No., Count, Fallout%] sorted by count, plus Grand Total.
+
+    et_counts is {ET label: count} for one C1_MARK.
+    """
+    theoretical = theoretical_value(theoretical_num)
+
+    fallout_table = []
+    for et_val in sorted(et_counts, key=pivot_sort_key):
+        count_val = et_counts[et_val]
+        fallout = (count_val / theoretical * 100) if theoretical else 0
+        fallout_table.append([et_val, count_val, f"{fallout:.2f}%"])
+
+    # Stable sort keeps the pivot order for ties
+    fallout_table.sort(key=lambda x: int(x[1]), reverse=True)
+    fallout_table.append(["Grand Total", normalize_label(theoretical_num), ""])
+    return fallout_table
+
+
+def safe_sheet_name(name):
+    # Excel sheet names: max 31 chars, none of : / \ ? * [ ]
+    for ch in ':/\\?*[]':
+        name = name.replace(ch, "_")
+    return name[:31]
+
+
+def build_summary_table(tables, theoretical_num):
+    """One row per C1_MARK: total fails, fallout %, and its top End Test No."""
+    theoretical = theoretical_value(theoretical_num)
+
+    summary = []
+    for mark, fallout_table in tables.items():
+        rows = fallout_table[:-1]   # without Grand Total
+        fails = sum(row[1] for row in rows)
+        fallout = (fails / theoretical * 100) if theoretical else 0
+        top_et, top_count = (rows[0][0], rows[0][1]) if rows else ("", 0)
+        summary.append([mark, fails, f"{fallout:.2f}%", top_et, top_count])
+    return summary
+
+
+def fallout_sheet_names(marks, reserved=()):
+    """{mark: sheet name} for the per-mark fallout sheets, kept unique and Excel-safe."""
+    names = {}
+    taken = set(reserved)
+    for mark in marks:
+        base = name = safe_sheet_name(f"Pivot_{mark}")
+        suffix = 1
+        while name in taken:
+            name = f"{base[:27]}_{suffix}"
+            suffix += 1
+        taken.add(name)
+        names[mark] = name
+    return names
+
+
+# --- Multi-lot aggregation (map: one parse per CSV, reduce: one combined pareto) ---
+def lot_counts(file_path, cache=None):
+    """Map step: the (C1_MARK, ET) fail counts and THEORETICAL_NUM of one CSV.
+
+    One pass over the file (or none on a cache hit). Returns a small,
+    picklable dict; errors are recorded in it instead of being raised.
+    """
+    lot = {"file": file_path, "lot": os.path.splitext(os.path.basename(file_path))[0]}
+    try:
+        cached = cache.get(file_path) if cache is not None else None
+        if cached is not None:
+            layout, counts, row_count = cached
+        else:
+            layout, counts, row_count = parse_csv(file_path)
+            if cache is not None:
+                cache.put(file_path, layout, counts, row_count)
+        if layout.c1_mark_row is None:
+            raise ValueError("First non-empty cell in Column G is not 'C1_MARK'")
+        lot.update(
+            theoretical_num=layout.theoretical_num,
+            rows=row_count,
+            counts=counts.by_mark(),
+        )
+    except Exception as e:
+        lot["error"] = str(e)
+    return lot
+
+
+def build_lot_fallout_table(lots, mark=None):
+    """Reduce step: one fallout pareto over many lots.
+
+    lots are lot_counts results (failed ones are skipped). Returns
+    (header, rows): one row per End Test No. with its count in every lot,
+    the total and the overall fallout %, sorted by total, then a Grand Total
+    and a Theoretical row. The overall fallout % is total fails over the
+    summed THEORETICAL_NUM, i.e. each lot weighted by its theoretical count;
+    a lot without THEORETICAL_NUM adds fails but no dies.
+    mark=None combines every C1_MARK.
+    """
+    lots = [lot for lot in lots if "error" not in lot]
+
+    # Column names: the lot name, made unique if two files share it
+    names = []
+    for lot in lots:
+        name, suffix = lot["lot"], 1
+        while name in names:
+            suffix += 1
+            name = f"{lot['lot']} ({suffix})"
+        names.append(name)
+
+    per_lot = []
+    for lot in lots:
+        merged = {}
+        for m, et_counts in lot["counts"].items():
+            if mark is None or m == mark:
+                for et, n in et_counts.items():
+                    merged[et] = merged.get(et, 0) + n
+        per_lot.append(merged)
+
+    theoretical = [theoretical_value(lot["theoretical_num"]) or 0 for lot in lots]
+    total_theoretical = sum(theoretical)
+
+    def fallout(fails):
+        return f"{(fails / total_theoretical * 100) if total_theoretical else 0:.2f}%"
+
+    ets = sorted({et for merged in per_lot for et in merged}, key=pivot_sort_key)
+    rows = []
+    for et in ets:
+        counts = [merged.get(et, 0) for merged in per_lot]
+        rows.append([et] + counts + [sum(counts), fallout(sum(counts))])
+    # Stable sort keeps the pivot order for ties
+    rows.sort(key=lambda row: row[-2], reverse=True)
+
+    lot_fails = [sum(merged.values()) for merged in per_lot]
+    rows.append(["Grand Total"] + lot_fails + [sum(lot_fails), fallout(sum(lot_fails))])
+    rows.append(["Theoretical"] + [normalize_label(lot["theoretical_num"]) for lot in lots]
+                + [normalize_label(total_theoretical), ""])
+
+    header = ["End Test No."] + names + ["Total", "Fallout%"]
+    return header, rows
+
+
+REFERENCE_HEADER = ["TSNO", "TESTNO", "COMMENT", "MODE", "HILIMIT", "LOLIMIT"]
+CHECK_HEADER = REFERENCE_HEADER + ["STATUS"]
+
+STATUS_LIMITS = "With Limits"
+STATUS_NO_LIMIT = "No Limit"
+STATUS_NOT_FOUND = "Not Found"
+
+
+def lookup_end_test(layout, end_test_no):
+    """Reference row (TSNO…LOLIMIT as strings) for an End Test No., or None if not found."""
+    if layout.lolimit_row is None:
+        raise ValueError("LOLIMIT not found in Column F")
+    return layout.reference.lookup(end_test_no)
+
+
+def has_limits(row_values):
+    return row_values[5] != ""
+
+
+def check_end_tests(layout, fallout_table, top_n=None):
+    """Check every fallout row (or only the top_n) against the reference table at once.
+
+    Returns one row per End Test No. in fallout order: TSNO…LOLIMIT plus a
+    STATUS column (With Limits / No Limit / Not Found).
+    """
+    if layout.lolimit_row is None:
+        raise ValueError("LOLIMIT not found in Column F")
+
+    rows = [row for row in fallout_table if row[0] != "Grand Total"]
+    if top_n:
+        rows = rows[:top_n]
+
+    checked = []
+    for row in rows:
+        row_values = layout.reference.lookup(row[0])
+        if row_values is None:
+            checked.append(["", normalize_label(row[0]), "", "", "", "", STATUS_NOT_FOUND])
+        else:
+            checked.append(row_values + [STATUS_LIMITS if has_limits(row_values) else STATUS_NO_LIMIT])
+    return checked
+
+
+def end_test_table(checked, top_n=1):
+    """The End Test rows written at H3 from check_end_tests rows.
+
+    A single check (top_n == 1) keeps the original six-column table and
+    only a found row; otherwise every row with its STATUS.
+    """
+    if top_n == 1:
+        return [row[:6] for row in checked if row[-1] != STATUS_NOT_FOUND]
+    return checked
+
+
+def build_report(layout, counts, mark=None, top_n=1, data_sheet_name=None):
+    """Fallout sheets, Summary and End Test tables for one parsed CSV.
+
+    With mark=None every C1_MARK gets its own fallout sheet plus a Summary;
+    otherwise only the Pivot sheet for that mark. The top_n End Test Nos.
+    of each fallout table (0/None = all of them) are checked against the
+    reference table and go to H3 of the same sheet.
+    Returns (report, tables, checked, names): report holds the sheets /
+    summary / end_tests arguments of the Excel writers, tables is
+    {C1_MARK: fallout table}, checked {C1_MARK: End Test rows with STATUS}
+    and names {C1_MARK: sheet name}. Raises ValueError if the layout has
+    no usable data block or mark is not one of its C1_MARKs.
+    """
+    if layout.c1_mark_row is None:
+        raise ValueError("First non-empty cell in Column G is not 'C1_MARK'")
+    if not layout.et_col or not layout.ft_col:
+        raise ValueError("'ET'/'FT' columns not found to the right of C1_MARK")
+    if mark is not None and mark not in layout.c1_marks:
+        raise ValueError(f"C1_MARK '{mark}' not found in {layout.c1_marks}")
+
+    # --- Fallout tables ---
+    grouped = counts.by_mark()
+    marks = [mark] if mark is not None else layout.c1_marks
+    tables = {m: build_fallout_table(grouped.get(m, {}), layout.theoretical_num) for m in marks}
+    if mark is not None:
+        names = {mark: "Pivot"}
+        summary = None
+    else:
+        names = fallout_sheet_names(marks, reserved=[data_sheet_name, "Summary"])
+        summary = build_summary_table(tables, layout.theoretical_num)
+
+    # --- End Test check on each table's highest fails End Test Nos ---
+    end_tests = {}
+    all_checked = {}
+    for m in marks:
+        checked = check_end_tests(layout, tables[m], top_n) if layout.lolimit_row is not None else []
+        all_checked[m] = checked
+        found = end_test_table(checked, top_n)
+        if found:
+            end_tests[names[m]] = found
+
+    report = {
+        "sheets": {names[m]: tables[m] for m in marks},
+        "summary": summary,
+        "end_tests": end_tests,
+    }
+    return report, tables, all_checked, names
+
+
+def default_report(layout, counts, data_sheet_name):
+    """The report a conversion puts next to the data: every C1_MARK, Summary, top End Test No.
+
+    Empty if the layout has no usable data block (the data sheet is still written).
+    """
+    try:
+        return build_report(layout, counts, data_sheet_name=data_sheet_name)[0]
+    except ValueError:
+        return {}
+
+
+def get_backend(name="file"):
+    """Excel backend by name: "file" (openpyxl, no Excel needed) or "xlwings" (live Excel).
+
+    Imported on first use, so parsing-only runs never load openpyxl or xlwings.
+    """
+    from deliverables_excel import BACKENDS
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown Excel backend '{name}' (choose from {', '.join(BACKENDS)})") from None
+
+
+def output_paths(file_path, out_dir=None):
+    """(out_file, sheet_name) for a CSV: .xlsx next to it (or in out_dir), sheet named after the file."""
+    base = os.path.splitext(os.path.basename(file_path))[0]
+    folder = out_dir if out_dir else os.path.dirname(file_path)
+    return os.path.join(folder, base + ".xlsx"), safe_sheet_name(base)
+
+
+def report_path(out_file):
+    """The small workbook that tables written on request go to, next to the data workbook."""
+    return os.path.splitext(out_file)[0] + "_report.xlsx"
+
+
+EXPORT_DIR_SUFFIX = "_export"
+
+
+def export_dir(out_file):
+    """Folder for a file's plain exports, next to its workbook.
+
+    A subfolder, so the exported .csv tables are not picked up as tester
+    CSVs by the next run over the same folder.
+    """
+    return os.path.splitext(out_file)[0] + EXPORT_DIR_SUFFIX
+
+
+def is_export_dir(folder):
+    """True if folder is the export_dir of a file beside it (<name>.xlsx or its <name>.csv).
+
+    Any other folder whose name happens to end in _export is a plain folder.
+    """
+    folder = os.path.normpath(folder)
+    if not folder.endswith(EXPORT_DIR_SUFFIX):
+        return False
+    base = folder[:-len(EXPORT_DIR_SUFFIX)]
+    return os.path.isfile(base + ".xlsx") or os.path.isfile(base + ".csv")
+
+
+class AppendState:
+    """Where the last parse of a growing CSV stopped.
+
+    Holds the layout, the running (C1_MARK, ET) counts, the row count and
+    the byte offset after the last parsed line, plus a hash of the file's
+    head and of the bytes just before that offset. A refresh only has to
+    parse what was appended past the offset; if the file got shorter or
+    those bytes changed, it was rewritten and needs a full rebuild.
+
+    A last line without its newline may still be being written, so it is
+    held back (tail = its length and hash) and left for the next parse,
+    which takes it as finished only if it is still exactly the same.
+    """
+
+    HEAD_BYTES = 64 * 1024
+    TAIL_BYTES = 4 * 1024
+
+    def __init__(self):
+        self.layout = LayoutIndex()
+        self.counts = FalloutCounts()
+        self.row_count = 0
+        self.offset = 0
+        self.ends_with_newline = True
+        self.signature = None
+        self.tail = None    # (bytes, hash) of an unterminated last line held back
+
+    def _signature(self, f, offset):
+        h = hashlib.blake2b(digest_size=16)
+        f.seek(0)
+        h.update(f.read(min(offset, self.HEAD_BYTES)))
+        start = max(0, offset - self.TAIL_BYTES)
+        f.seek(start)
+        h.update(f.read(offset - start))
+        return h.hexdigest()
+
+    @staticmethod
+    def _tail_hash(f, offset, size):
+        f.seek(offset)
+        return hashlib.blake2b(f.read(size - offset), digest_size=16).hexdigest()
+
+    def mark(self, file_path, offset, ends_with_newline, held_bytes=0):
+        # Remember that everything before offset has been parsed; held_bytes
+        # of an unfinished last line follow it
+        self.offset = offset
+        self.ends_with_newline = ends_with_newline
+        with open(file_path, "rb") as f:
+            self.signature = self._signature(f, offset)
+            self.tail = (held_bytes, self._tail_hash(f, offset, offset + held_bytes)) if held_bytes else None
+
+    def tail_settled(self, file_path):
+        """True if the line held back last time is, unchanged, all there is past offset."""
+        if self.tail is None:
+            return False
+        with open(file_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            return size == self.offset + self.tail[0] and self._tail_hash(f, self.offset, size) == self.tail[1]
+
+    def check(self, file_path):
+        """"same", "appended" or "rewritten" compared with the last parse."""
+        size = os.path.getsize(file_path)
+        if self.signature is None or size < self.offset:
+            return "rewritten"
+        with open(file_path, "rb") as f:
+            if self._signature(f, self.offset) != self.signature:
+                return "rewritten"
+        if size == self.offset:
+            return "same"
+        # A line already parsed as finished (no newline) has grown: its row was wrong
+        return "appended" if self.ends_with_newline else "rewritten"
+
+    @property
+    def fingerprint(self):
+        # Identifies the parsed content; moves on with every refresh or rebuild
+        return f"{self.offset}:{self.signature}"
+
+
+def parse_csv(file_path, sink=None, progress=None, cancel=None, state=None, store=None):
+    """One sequential pass over the CSV, building the LayoutIndex and FalloutCounts.
+
+    Rows are typed a block at a time (see convert_rows) and, if given, each
+    typed row is handed to sink(values) — e.g. a worksheet's append.
+    progress(bytes_read, total_bytes) is called after every block.
+    If cancel (a threading.Event) gets set, ConversionCancelled is raised.
+    With state (an AppendState) parsing resumes at state.offset with its
+    layout and counts, and state is moved on to where this pass stopped;
+    an unterminated last line is held back (see AppendState).
+    With store (a ColumnStore) every data block row is also kept, columnar.
+    Returns (layout, counts, row_count).
+    """
+    if state is not None:
+        layout, counts, row_count, start = state.layout, state.counts, state.row_count, state.offset
+    else:
+        layout, counts, row_count, start = LayoutIndex(), FalloutCounts(), 0, 0
+
+    total_bytes = os.path.getsize(file_path) - start
+    bytes_read = 0
+    last_line = b"\n"
+    hold_tail = state is not None and not state.tail_settled(file_path)
+    held_bytes = 0
+
+    def decoded_lines(f):
+        # Read bytes so progress can be measured, hand text lines to csv.reader
+        nonlocal bytes_read, last_line, held_bytes
+        for raw in f:
+            if hold_tail and not raw.endswith(b"\n"):
+                held_bytes = len(raw)     # still being written, maybe
+                return
+            bytes_read += len(raw)
+            last_line = raw
+            yield raw.decode('utf-8')
+
+    def handle_block(block):
+        nonlocal row_count
+        for values in convert_rows(block):
+            if sink is not None:
+                sink(values)
+            row_count += 1
+            if layout.observe(row_count, values):
+                counts.add_row(layout, values)
+                if store is not None:
+                    store.add_row(layout, values)
+            elif store is not None and row_count == layout.c1_mark_row:
+                store.start(layout)
+
+        if cancel is not None and cancel.is_set():
+            raise ConversionCancelled("Conversion cancelled")
+        if progress:
+            progress(bytes_read, total_bytes)
+
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        block = []
+        for row in csv.reader(decoded_lines(f)):
+            block.append(row)
+            if len(block) >= BLOCK_ROWS:
+                handle_block(block)
+                block = []
+        handle_block(block)
+
+    if progress:
+        progress(total_bytes, total_bytes)
+
+    if state is not None:
+        layout._reference = None   # rebuilt on next use in case the reference table grew
+        state.row_count = row_count
+        state.mark(file_path, start + bytes_read, last_line.endswith(b"\n"), held_bytes)
+
+    return layout, counts, row_count
+
+
+def stream_csv_to_xlsx(file_path, out_file, sheet_name, progress=None, cancel=None, timer=None, state=None,
+                       report=None):
+    """Write the CSV into a single-sheet .xlsx one row at a time.
+
+    Uses a streaming sheet writer (openpyxl's write-only workbook, see
+    deliverables_excel) so memory stays flat regardless of the CSV size.
+    The LayoutIndex and the (C1_MARK, ET) FalloutCounts are built on the
+    way through (see parse_csv) so nothing has to reopen the workbook.
+    If cancel gets set, ConversionCancelled is raised and no workbook is
+    written. timer is an optional RunTimer; parsing and the final save get
+    separate spans. A fresh AppendState passed as state
+    records where the file ended, for later refresh_xlsx calls.
+    report(layout, counts, sheet_name) → sheets / summary / end_tests (e.g.
+    default_report) is called once the counts are complete; those sheets
+    go into the same workbook before its single save.
+    Returns (layout, counts, row_count, elapsed_seconds).
+    """
+    start = time.perf_counter()
+
+    writer = get_backend().sheet_writer(out_file, sheet_name)
+
+    try:
+        with span(timer, "parse + write rows", nbytes=os.path.getsize(file_path)) as s:
+            layout, counts, row_count = parse_csv(file_path, writer.append, progress, cancel, state)
+            s["rows"] = row_count
+        if report is not None:
+            with span(timer, "write tables"):
+                writer.write_report(**report(layout, counts, sheet_name))
+    except BaseException:
+        # Nothing is saved
+        writer.discard()
+        raise
+
+    with span(timer, "save workbook") as s:
+        writer.save()
+        s["bytes"] = os.path.getsize(out_file)
+
+    return layout, counts, row_count, time.perf_counter() - start
+
+
+# --- Parallel parsing of one big CSV ---
+# The header block (THEORETICAL_NUM, reference table, C1_MARK header) is read
+# sequentially; the data section after it is cut into byte ranges on line
+# boundaries and scanned on a process pool. Only C1_MARK / ET / FT (and
+# Column A, for a late THEORETICAL_NUM) are typed in the workers.
+# Chunks split on raw line breaks, so a quoted field spanning lines would be
+# cut in two: a worker that sees one reports it and the whole file is parsed
+# sequentially instead.
+
+PARALLEL_MIN_CHUNK = 8 * 1024 * 1024
+
+
+class MappedCSV:
+    """A tester CSV as a read-only memory map, with lazy views of its sections.
+
+    Lines are found with find() on the raw bytes and only decoded when
+    looked at; records() feeds them through one csv.reader, so a quoted
+    field may span lines as in parse_csv. Opening reads the header block
+    alone (up to and including the C1_MARK row, through LayoutIndex.observe,
+    so the anchors follow the same rules as parse_csv); nothing of the data
+    section is read or copied, so the layout of a multi-GB log is known in
+    milliseconds. header_limit caps the bytes scanned for the header (for a
+    quick look at a file that may have none); header_truncated is then set
+    if the cap was hit first.
+    reference is layout.reference (the TSNO…LOLIMIT rows) and data a
+    DataView of the rows below the C1_MARK header. Close it when done, or
+    use it as a context manager.
+    """
+
+    def __init__(self, file_path, header_limit=None):
+        self.file_path = file_path
+        self.header_limit = header_limit
+        self.header_truncated = False
+        self._file = open(file_path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        # mmap refuses empty files; an empty bytes object has the same find()
+        self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+        self.layout = LayoutIndex()
+        self.header_rows = 0
+        self.data_offset = None   # byte offset of the first data row
+        self._scan_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self._file.close()
+
+    def lines(self, start=0, end=None):
+        """(start, end) byte spans of the lines in [start, end), newline included."""
+        end = self.size if end is None else end
+        while start < end:
+            stop = self.buffer.find(b"\n", start, end)
+            stop = end if stop < 0 else stop + 1
+            yield start, stop
+            start = stop
+
+    def records(self, start=0, end=None):
+        """(start, end, typed values) of each CSV record from start on.
+
+        csv.reader pulls exactly the lines of one record and does not read
+        ahead, so end is the offset after the record's last line.
+        """
+        position = start
+
+        def text():
+            nonlocal position
+            for line_start, line_end in self.lines(start, end):
+                position = line_end
+                yield self.buffer[line_start:line_end].decode('utf-8')
+
+        record_start = start
+        for values in csv.reader(text()):
+            yield record_start, position, [convert_cell(value) for value in values]
+            record_start = position
+
+    def _scan_header(self):
+        for start, end, values in self.records():
+            if self.header_limit is not None and start >= self.header_limit:
+                self.header_truncated = True
+                return
+            self.header_rows += 1
+            self.layout.observe(self.header_rows, values)
+            if self.layout.c1_mark_row is not None:
+                self.data_offset = end
+                return
+            if self.layout._g_seen:
+                return      # first non-empty Column G is not C1_MARK: no data block
+
+    @property
+    def reference(self):
+        return self.layout.reference
+
+    @property
+    def data(self):
+        return DataView(self) if self.data_offset is not None else None
+
+
+class DataView:
+    """Lazy view of the data block of a MappedCSV (rows below the C1_MARK header).
+
+    Iterating decodes one row at a time and stops where Column G turns
+    blank, like the data block in LayoutIndex. raw is the data section as
+    a zero-copy memoryview (to the end of the file); release it before
+    the MappedCSV is closed.
+    """
+
+    def __init__(self, mapped):
+        self.mapped = mapped
+        self.offset = mapped.data_offset
+
+    @property
+    def columns(self):
+        return self.mapped.layout.columns
+
+    @property
+    def raw(self):
+        return memoryview(self.mapped.buffer)[self.offset:]
+
+    def __iter__(self):
+        for _, _, values in self.mapped.records(self.offset):
+            if is_blank(values[6] if len(values) > 6 else None):
+                return
+            yield values
+
+    def head(self, n=10):
+        return list(islice(self, n))
+
+    def estimate_rows(self, sample=1000):
+        """Row count guessed from the average length of the first sample lines."""
+        spans = list(islice(self.mapped.lines(self.offset), sample))
+        if not spans:
+            return 0
+        average = (spans[-1][1] - self.offset) / len(spans)
+        return round((self.mapped.size - self.offset) / average)
+
+
+def scan_header(file_path):
+    """Read up to and including the C1_MARK header row.
+
+    Returns (layout, row_count, data_offset); data_offset is the byte offset
+    of the first data row, or None if the header was not found.
+    """
+    with MappedCSV(file_path) as mapped:
+        return mapped.layout, mapped.header_rows, mapped.data_offset
+
+
+def _scan_chunk(file_path, start, end, et_col, ft_col, find_theoretical):
+    # Worker: partial counts / marks for the rows in [start, end)
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    # A record spanning lines opens a quote on a line that does not close it
+    if b'"' in data and any(line.count(b'"') % 2 for line in data.split(b"\n") if b'"' in line):
+        return {"multiline": True}
+
+    counts = FalloutCounts()
+    marks = {}
+    rows = 0
+    data_rows = None        # rows before the data block ended, if it ends here
+    theoretical = None      # (row offset in chunk, value)
+
+    lines = (raw.decode('utf-8') for raw in io.BytesIO(data))
+    for row in csv.reader(lines):
+        rows += 1
+        width = len(row)
+
+        if find_theoretical and theoretical is None and width > 0 \
+                and str(convert_cell(row[0])).strip().upper() == "THEORETICAL_NUM":
+            theoretical = (rows - 1, convert_cell(row[2]) if width > 2 else None)
+
+        if data_rows is not None:
+            continue
+        col_g = convert_cell(row[6]) if width > 6 else None
+        if is_blank(col_g):
+            data_rows = rows - 1
+            continue
+
+        mark = normalize_label(col_g)
+        if mark:
+            marks[mark] = None
+        counts.add(
+            col_g,
+            convert_cell(row[et_col - 1]) if width >= et_col else None,
+            convert_cell(row[ft_col - 1]) if width >= ft_col else None,
+        )
+
+    return {
+        "multiline": False,
+        "rows": rows,
+        "data_rows": rows if data_rows is None else data_rows,
+        "ended": data_rows is not None,
+        "marks": list(marks),
+        "counts": counts.counts,
+        "theoretical": theoretical,
+    }
+
+
+def chunk_offsets(file_path, start, n_chunks):
+    """Split [start, EOF) into about n_chunks ranges that begin at line starts."""
+    size = os.path.getsize(file_path)
+    step = max((size - start) // max(n_chunks, 1), 1)
+    bounds = [start]
+    with open(file_path, 'rb') as f:
+        target = start + step
+        while target < size:
+            f.seek(target - 1)
+            f.readline()            # finish the line the target falls in
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+            target = max(pos, target) + step
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def parse_parallel(file_path, workers=None, chunk_bytes=PARALLEL_MIN_CHUNK):
+    """Same (layout, counts, row_count) as parse_csv, with the data section on a process pool.
+
+    Falls back to parse_csv for small files, one worker, header layouts
+    the chunked scan can't reproduce exactly (reference table not closed
+    before the data block, ET/FT missing), or quoted line breaks after the
+    header block.
+    """
+    workers = workers or os.cpu_count() or 1
+    layout, header_rows, data_offset = scan_header(file_path)
+    size = os.path.getsize(file_path)
+
+    if (workers == 1 or data_offset is None or size - data_offset < 2 * chunk_bytes
+            or layout._in_ref or not layout._f_seen or not layout.et_col or not layout.ft_col):
+        return parse_csv(file_path)
+
+    n_chunks = min(workers * 4, max((size - data_offset) // chunk_bytes, 1))
+    ranges = chunk_offsets(file_path, data_offset, n_chunks)
+    find_theoretical = layout.theoretical_row is None
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        parts = list(pool.map(
+            _scan_chunk,
+            [file_path] * len(ranges),
+            [start for start, _ in ranges],
+            [end for _, end in ranges],
+            [layout.et_col] * len(ranges),
+            [layout.ft_col] * len(ranges),
+            [find_theoretical] * len(ranges),
+        ))
+
+    if any(part["multiline"] for part in parts):
+        return parse_csv(file_path)
+
+    # --- Merge in file order, exactly as a sequential pass would have seen it ---
+    counts = FalloutCounts()
+    row_count = header_rows
+    data_ended = False
+    for part in parts:
+        if find_theoretical and layout.theoretical_row is None and part["theoretical"]:
+            offset, value = part["theoretical"]
+            layout.theoretical_row = row_count + offset + 1
+            layout.theoretical_num = value
+
+        if not data_ended:
+            for mark in part["marks"]:
+                layout._marks[mark] = None
+            for key, n in part["counts"].items():
+                counts.counts[key] = counts.counts.get(key, 0) + n
+            if part["data_rows"]:
+                layout.data_last_row = row_count + part["data_rows"]
+            data_ended = part["ended"]
+
+        row_count += part["rows"]
+
+    layout._in_data = not data_ended
+    return layout, counts, row_count
+
+
+def convert_or_load(file_path, out_file, sheet_name, cache=None, progress=None, cancel=None, timer=None,
+                    state=None, report=None):
+    """stream_csv_to_xlsx, skipped when the cache already knows this CSV.
+
+    The cached layout and counts are only used if the .xlsx from the earlier
+    conversion is still there. A fresh AppendState passed as state is filled
+    in either way, so the file can be refreshed incrementally afterwards.
+    report is passed on to stream_csv_to_xlsx; on a cache hit the workbook
+    keeps the report sheets it was written with.
+    Returns (layout, counts, row_count, elapsed_seconds, from_cache).
+    """
+    if cache is not None and os.path.exists(out_file):
+        start = time.perf_counter()
+        size = os.path.getsize(file_path)
+        with span(timer, "cache lookup"):
+            cached = cache.get(file_path)
+        if cached is not None:
+            layout, counts, row_count = cached
+            if state is not None:
+                # The cache entry matches the whole file as it is now
+                state.layout, state.counts, state.row_count = layout, counts, row_count
+                with open(file_path, "rb") as f:
+                    f.seek(max(size - 1, 0))
+                    state.mark(file_path, size, f.read(1) in (b"\n", b""))
+            return layout, counts, row_count, time.perf_counter() - start, True
+
+    layout, counts, row_count, elapsed = stream_csv_to_xlsx(
+        file_path, out_file, sheet_name, progress=progress, cancel=cancel, timer=timer, state=state,
+        report=report
+    )
+    # A held-back last line means the counts don't cover the whole file yet
+    if cache is not None and (state is None or state.tail is None):
+        cache.put(file_path, layout, counts, row_count)
+    return layout, counts, row_count, elapsed, False
+
+
+def refresh_xlsx(file_path, out_file, sheet_name, state, pivot_mark=None, cache=None,
+                 progress=None, cancel=None, timer=None, end_test_top_n=None):
+    """Bring a converted .xlsx up to date with rows appended to its CSV.
+
+    Only the bytes after state.offset are parsed; the new rows are appended
+    to the data sheet and its report sheets rebuilt from the updated counts
+    (FileBackend.update_data_workbook). With pivot_mark, the fallout table
+    on the Pivot sheet of the report workbook is rewritten in place, and
+    the End Test rows at H3 with it: the end_test_top_n End Test Nos. of
+    the new table are checked again (None = no End Test rows, H3 cleared),
+    so they follow the new ranking. If the CSV was truncated or rewritten
+    (see AppendState.check), or the .xlsx is gone, the data workbook is
+    converted from scratch.
+
+    Limit: parsing scales with the appended bytes, but an .xlsx sheet is a
+    single deflated stream, so appending still copies the whole data sheet
+    through zlib (about 1 s per 100k rows; memory stays flat). A workbook
+    that has been saved by Excel cannot be spliced and is converted again.
+    state itself is left untouched, so a cancelled refresh changes nothing.
+    Returns (new_state, new_rows, rebuilt, fallout_table or None,
+    End Test rows written at H3 or None).
+    """
+    change = state.check(file_path) if os.path.exists(out_file) else "rewritten"
+    if change == "same":
+        return state, 0, False, None, None
+
+    backend = get_backend()
+    if change == "rewritten":
+        new_state = AppendState()
+        stream_csv_to_xlsx(file_path, out_file, sheet_name, progress, cancel, timer, new_state, default_report)
+        new_rows, rebuilt = new_state.row_count, True
+    else:
+        new_state = copy.deepcopy(state)
+        rows = []
+        with span(timer, "parse appended rows", nbytes=os.path.getsize(file_path) - state.offset) as s:
+            parse_csv(file_path, rows.append, progress, cancel, new_state)
+            s["rows"] = len(rows)
+        new_rows, rebuilt = len(rows), False
+
+        if rows:
+            report = default_report(new_state.layout, new_state.counts, sheet_name)
+            try:
+                backend.update_data_workbook(out_file, sheet_name, report, (state.row_count + 1, rows), timer)
+            except WorkbookNotAppendable:
+                # Saved by Excel since: convert again (the CSV itself only grew)
+                new_state = AppendState()
+                stream_csv_to_xlsx(file_path, out_file, sheet_name, progress, cancel, timer, new_state, default_report)
+                new_rows = new_state.row_count - state.row_count
+
+    fallout_table = end_tests = None
+    if pivot_mark is not None and (new_rows or rebuilt):
+        layout = new_state.layout
+        fallout_table = build_fallout_table(new_state.counts.for_mark(pivot_mark), layout.theoretical_num)
+        end_tests = []
+        if end_test_top_n is not None and layout.lolimit_row is not None:
+            end_tests = end_test_table(check_end_tests(layout, fallout_table, end_test_top_n), end_test_top_n)
+        backend.write_report(report_path(out_file), sheets={"Pivot": fallout_table}, end_tests={"Pivot": end_tests},
+                             timer=timer)
+
+    # Only cache what matches the file as it is right now
+    if cache is not None and os.path.getsize(file_path) == new_state.offset:
+        cache.put(file_path, new_state.layout, new_state.counts, new_state.row_count)
+    return new_state, new_rows, rebuilt, fallout_table, end_tests
+
+
+def process_file(file_path, mark=None, out_dir=None, top_n=1, cache=None,
+                 write_xlsx=True, parse_workers=None, exports=()):
+    """Run the convert → fallout → End Test check pipeline on one CSV, headless.
+
+    The report (see build_report) goes into the .xlsx with the data, in the
+    conversion's single save. cache is an optional DatasetCache; a hit
+    skips the CSV conversion and only the workbook's report sheets are
+    replaced (FileBackend.update_data_workbook).
+
+    With write_xlsx=False no workbook is produced: the CSV is only parsed,
+    with the data section split over parse_workers processes (see
+    parse_parallel), and the fallout tables go into the result instead.
+    exports lists formats from deliverables_export.EXPORT_FORMATS ("csv",
+    "jsonl", "columnar"): the fallout, End Test and per-mark count tables
+    are also written as <table>.<ext> in export_dir (<name>_export/ next to
+    where the .xlsx goes).
+
+    Returns a JSON-friendly dict. Errors are recorded in it instead of being
+    raised, so one bad file does not stop a batch.
+    """
+    start = time.perf_counter()
+    result = {"file": file_path, "status": "ok"}
+    built = {}
+
+    def report(layout, counts, data_sheet_name):
+        # A layout error is raised after the conversion, so the data is still saved
+        try:
+            built["report"] = build_report(layout, counts, mark, top_n, data_sheet_name)
+        except ValueError as e:
+            built["error"] = e
+            return {}
+        return built["report"][0]
+
+    try:
+        out_file, sheet_name = output_paths(file_path, out_dir)
+        exports_folder = export_dir(out_file)
+        if write_xlsx:
+            layout, counts, row_count, convert_seconds, from_cache = convert_or_load(
+                file_path, out_file, sheet_name, cache=cache, report=report
+            )
+            if from_cache:
+                # The cached workbook may hold a report built with other options
+                try:
+                    get_backend().update_data_workbook(out_file, sheet_name, report(layout, counts, sheet_name))
+                except WorkbookNotAppendable:
+                    layout, counts, row_count, convert_seconds, from_cache = convert_or_load(
+                        file_path, out_file, sheet_name, report=report
+                    )
+        else:
+            parse_start = time.perf_counter()
+            out_file, from_cache = None, False
+            layout, counts, row_count = parse_parallel(file_path, parse_workers)
+            convert_seconds = time.perf_counter() - parse_start
+            report(layout, counts, sheet_name)
+        result.update(
+            out_file=out_file, rows=row_count,
+            convert_seconds=round(convert_seconds, 3), from_cache=from_cache
+        )
+
+        if "error" in built:
+            raise built["error"]
+        _, tables, all_checked, names = built["report"]
+        mark_results = []
+        for m, fallout_table in tables.items():
+            mark_results.append({
+                "c1_mark": m,
+                "sheet": names[m],
+                "fails": sum(row[1] for row in fallout_table[:-1]),
+                "top_end_test": fallout_table[0][0] if len(fallout_table) > 1 else "",
+                "end_tests": [{"testno": row[1], "status": row[6]} for row in all_checked[m]],
+            })
+            if not write_xlsx:
+                mark_results[-1]["fallout"] = fallout_table
+        result["marks"] = mark_results
+
+        # --- Plain exports, written from the results (no workbook) ---
+        if exports:
+            from deliverables_export import export_report, report_tables
+            result["exports"] = export_report(exports_folder, exports, report_tables(layout, counts, tables, all_checked))
+
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
@@ -0,0 +1,514 @@
+import math
+import os
+import tempfile
+import zipfile
+from datetime import datetime
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+from deliverables_core import (
+    CHECK_HEADER,
+    STATUS_NO_LIMIT,
+    STATUS_NOT_FOUND,
+    WorkbookNotAppendable,
+)
+from deliverables_timing import span
+
+# Deliverables Automation Tool — Excel backends
+# Author: Rose Anne Lafuente
+# Description: Everything that touches .xlsx files. FileBackend reads and
+# writes the workbook directly with openpyxl and needs no Excel; the
+# optional XlwingsBackend adds the live Excel PivotTable on top of it.
+# deliverables_core.get_backend() imports this module on first use, so
+# parsing-only runs never load openpyxl, and xlwings is only imported when
+# a PivotTable is actually requested.
+#
+# The data workbook is never loaded back into memory: its report sheets are
+# written with the data in one streaming save (SheetWriter.write_report),
+# rows added later are spliced into the data sheet's XML inside the zip
+# (FileBackend.update_data_workbook), and tables written on request go to a
+# small separate report workbook (FileBackend.write_report).
+
+
+# --- Pivot sheet formatting (same look as the Excel version) ---
+HEADER_FILL = PatternFill("solid", fgColor="C0E6F5")
+HIGHLIGHT_FILL = PatternFill("solid", fgColor="FF9F9F")
+NO_LIMIT_FILL = PatternFill("solid", fgColor="FFE699")
+NOT_FOUND_FILL = PatternFill("solid", fgColor="FF9F9F")
+THIN = Side(style="thin")
+MEDIUM = Side(style="medium")
+CENTER = Alignment(horizontal="center", vertical="center", indent=0)
+
+# Style role → (fill, bold)
+STYLE_ROLES = {
+    "cell": (None, False),
+    "header": (HEADER_FILL, True),
+    "highlight": (HIGHLIGHT_FILL, True),
+    "total": (HEADER_FILL, True),
+    "no_limit": (NO_LIMIT_FILL, False),
+    "not_found": (NOT_FOUND_FILL, False),
+}
+STATUS_ROLES = {STATUS_NO_LIMIT: "no_limit", STATUS_NOT_FOUND: "not_found"}
+
+# Where each table sits: (first row, first column)
+FALLOUT_ANCHOR = (3, 4)      # D3
+END_TEST_ANCHOR = (3, 8)     # H3
+SUMMARY_HEADER = ["C1_MARK", "Fails", "Fallout%", "Top End Test No.", "Top Count"]
+
+
+class TableStyles:
+    """Named styles for the report tables, added to a workbook as first used.
+
+    Each table cell gets exactly one named style: its role (STYLE_ROLES)
+    combined with which of its sides lie on the table's outer edge (medium
+    border there, thin inside, centered text). Every combination is built
+    once per workbook, so the formatting cost does not grow with the
+    number of tables, and the styles show up in Excel's Cell Styles.
+    """
+
+    def __init__(self, wb):
+        self.wb = wb
+        self.names = set(wb.named_styles)
+
+    def name(self, role, left, right, top, bottom):
+        edges = "".join(side for side, outer in zip("LRTB", (left, right, top, bottom)) if outer)
+        name = f"Deliverables {role} {edges or '-'}"
+        if name not in self.names:
+            fill, bold = STYLE_ROLES[role]
+            style = NamedStyle(
+                name=name,
+                font=Font(bold=bold),
+                alignment=CENTER,
+                border=Border(
+                    left=MEDIUM if left else THIN,
+                    right=MEDIUM if right else THIN,
+                    top=MEDIUM if top else THIN,
+                    bottom=MEDIUM if bottom else THIN,
+                ),
+            )
+            if fill is not None:
+                style.fill = fill
+            self.wb.add_named_style(style)
+            self.names.add(name)
+        return name
+
+
+# --- Tables as (row, column, value, style name) cells ---
+def table_cells(styles, anchor, header, rows, roles=None, cell_roles=None):
+    """Header row and data rows from anchor (first row, first column).
+
+    roles is {row index: style role} with 0 = header (default "header",
+    "cell" for data rows); cell_roles is {(row index, column index): role}
+    for single cells such as the STATUS column.
+    """
+    roles = roles or {}
+    cell_roles = cell_roles or {}
+    first_row, first_col = anchor
+    table = [header] + list(rows)
+    last_i, last_j = len(table) - 1, len(header) - 1
+
+    cells = []
+    for i, values in enumerate(table):
+        row_role = roles.get(i, "header" if i == 0 else "cell")
+        for j, value in enumerate(values):
+            style = styles.name(cell_roles.get((i, j), row_role), j == 0, j == last_j, i == 0, i == last_i)
+            cells.append((first_row + i, first_col + j, value, style))
+    return cells
+
+
+def fallout_cells(styles, fallout_table):
+    # Header at D3, rows from D4, top fail highlighted, Grand Total last
+    roles = {len(fallout_table): "total"}
+    if len(fallout_table) > 1:
+        roles[1] = "highlight"
+    return table_cells(styles, FALLOUT_ANCHOR, ["End Test No.", "Count", "Fallout%"], fallout_table, roles)
+
+
+def end_test_cells(styles, rows):
+    # Header at H3, reference rows from H4; 7-value rows get the STATUS column
+    if not rows:
+        return []
+    header = CHECK_HEADER[:len(rows[0])]
+    cell_roles = {}
+    if len(header) == len(CHECK_HEADER):
+        for i, row in enumerate(rows, start=1):
+            if row[-1] in STATUS_ROLES:
+                cell_roles[(i, len(header) - 1)] = STATUS_ROLES[row[-1]]
+    return table_cells(styles, END_TEST_ANCHOR, header, rows, cell_roles=cell_roles)
+
+
+def summary_cells(styles, summary):
+    return table_cells(styles, FALLOUT_ANCHOR, SUMMARY_HEADER, summary)
+
+
+def lot_cells(styles, header, rows):
+    # Top End Test highlighted; Grand Total and Theoretical rows last
+    roles = {len(rows) - 1: "total", len(rows): "total"}
+    if len(rows) > 2:
+        roles[1] = "highlight"
+    return table_cells(styles, FALLOUT_ANCHOR, header, rows, roles)
+
+
+def report_cells(styles, sheets=None, summary=None, end_tests=None):
+    """{sheet name: cells} for a report, Summary first, then the fallout sheets."""
+    cells = {}
+    if summary is not None:
+        cells["Summary"] = summary_cells(styles, summary)
+    for name, fallout_table in (sheets or {}).items():
+        cells[name] = fallout_cells(styles, fallout_table)
+    for name, rows in (end_tests or {}).items():
+        cells.setdefault(name, []).extend(end_test_cells(styles, rows))
+    return cells
+
+
+def put_cells(ws, cells):
+    # Regular worksheet: cells can go anywhere
+    for r, c, value, style in cells:
+        cell = ws.cell(row=r, column=c, value=value)
+        cell.style = style
+
+
+def append_cells(ws, cells):
+    # Write-only worksheet: whole rows, top to bottom
+    grid = {}
+    for r, c, value, style in cells:
+        grid.setdefault(r, {})[c] = (value, style)
+    for r in range(1, max(grid, default=0) + 1):
+        row = grid.get(r, {})
+        values = [None] * max(row, default=0)
+        for c, (value, style) in row.items():
+            cell = WriteOnlyCell(ws, value)
+            cell.style = style
+            values[c - 1] = cell
+        ws.append(values)
+
+
+def clear_table(ws, anchor, width):
+    # Empty the table a previous write left at anchor: rows down to the first
+    # one blank across the table's width (a Not Found row has no TSNO)
+    first_row, first_col = anchor
+    r = first_row
+    while True:
+        cells = [ws.cell(row=r, column=c) for c in range(first_col, first_col + width)]
+        if all(cell.value is None for cell in cells):
+            return
+        for cell in cells:
+            cell.value = None
+            cell.style = "Normal"
+        r += 1
+
+
+class SheetWriter:
+    """Data workbook written row by row (openpyxl write-only mode).
+
+    write_report adds the report sheets after the data sheet; everything
+    goes out in the one save().
+    """
+
+    def __init__(self, out_file, sheet_name):
+        self.out_file = out_file
+        self.wb = openpyxl.Workbook(write_only=True)
+        self.ws = self.wb.create_sheet(title=sheet_name)
+        self.append = self.ws.append
+
+    def write_report(self, sheets=None, summary=None, end_tests=None):
+        styles = TableStyles(self.wb)
+        for name, cells in report_cells(styles, sheets, summary, end_tests).items():
+            append_cells(self.wb.create_sheet(title=name), cells)
+
+    def save(self):
+        self.wb.save(self.out_file)
+        self.wb.close()
+
+    def discard(self):
+        # Release the write-only sheet's temp file; nothing is saved
+        self.ws.close()
+
+
+# --- Splicing rows into the data sheet of a SheetWriter workbook ---
+SHEET_DATA_END = b"</sheetData>"
+SHEET_DATA_EMPTY = (b"<sheetData />", b"<sheetData/>")
+COPY_CHUNK = 1024 * 1024
+# Fastest zlib level: a refresh recompresses the whole data sheet, and
+# level 1 is ~3x quicker than the default for a ~30% larger file
+SPLICE_COMPRESSLEVEL = 1
+
+
+def _sheet_part(zf, sheet_name):
+    # Zip member holding the named sheet, via workbook.xml and its rels
+    ns = {
+        "m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+        "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+        "p": "http://schemas.openxmlformats.org/package/2006/relationships",
+    }
+    workbook = ElementTree.fromstring(zf.read("xl/workbook.xml"))
+    rels = ElementTree.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    for sheet in workbook.iterfind("m:sheets/m:sheet", ns):
+        if sheet.get("name") == sheet_name:
+            rel_id = sheet.get(f"{{{ns['r']}}}id")
+            for rel in rels.iterfind("p:Relationship", ns):
+                if rel.get("Id") == rel_id:
+                    target = rel.get("Target")
+                    return target.lstrip("/") if target.startswith("/") else "xl/" + target
+    raise WorkbookNotAppendable(f"Sheet '{sheet_name}' not found")
+
+
+def rows_xml(first_row, rows):
+    """<row> elements for rows numbered from first_row, written like openpyxl does."""
+    letters = {}
+    out = []
+    for r, values in enumerate(rows, start=first_row):
+        cells = []
+        for c, value in enumerate(values, start=1):
+            if value is None or value == "":
+                continue
+            if c not in letters:
+                letters[c] = get_column_letter(c)
+            ref = f"{letters[c]}{r}"
+            if isinstance(value, str):
+                space = ' xml:space="preserve"' if value != value.strip() else ""
+                cells.append(f'<c r="{ref}" t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>')
+            elif isinstance(value, float) and not math.isfinite(value):
+                cells.append(f'<c r="{ref}" t="n"><v /></c>')
+            else:
+                cells.append(f'<c r="{ref}" t="n"><v>{value}</v></c>')
+        out.append(f'<row r="{r}">{"".join(cells)}</row>')
+    return "".join(out).encode("utf-8")
+
+
+def _copy_sheet_data(src, dst, new_rows):
+    # Stream the sheet XML through, inserting new_rows before </sheetData>.
+    # A styled cell (s="…") means the sheet was edited outside this tool.
+    keep = len(SHEET_DATA_END)
+    tail = b""
+    inserted = False
+    for chunk in iter(lambda: src.read(COPY_CHUNK), b""):
+        if inserted:
+            dst.write(chunk)
+            continue
+        buf = tail + chunk
+        if b' s="' in buf or b"<dimension" in buf:
+            raise WorkbookNotAppendable("Data sheet was saved by another program")
+        for empty in SHEET_DATA_EMPTY:
+            i = buf.find(empty)
+            if i >= 0:
+                buf = buf[:i] + b"<sheetData>" + SHEET_DATA_END + buf[i + len(empty):]
+        i = buf.find(SHEET_DATA_END)
+        if i >= 0:
+            dst.write(buf[:i] + new_rows + buf[i:])
+            inserted, tail = True, b""
+        else:
+            dst.write(buf[:-keep])
+            tail = buf[-keep:]
+    dst.write(tail)
+    if not inserted:
+        raise WorkbookNotAppendable("No sheet data found")
+
+
+class FileBackend:
+    """Writes the deliverables straight into .xlsx files with openpyxl."""
+
+    name = "file"
+
+    def sheet_writer(self, out_file, sheet_name):
+        return SheetWriter(out_file, sheet_name)
+
+    def update_data_workbook(self, out_file, data_sheet_name, report=None, data_rows=None, timer=None):
+        """Append rows to the data sheet and replace the report sheets, without loading the workbook.
+
+        report is the sheets / summary / end_tests arguments of
+        SheetWriter.write_report (the report sheets are rebuilt from it,
+        the previous ones dropped); data_rows is (first_row, rows).
+        The data sheet's XML is streamed from the old zip into a new one
+        with the rows inserted, so memory stays flat; the time is one
+        decompress + recompress of the workbook (zlib speed, no openpyxl
+        parsing). Only works on workbooks written by SheetWriter; anything
+        else raises WorkbookNotAppendable and the caller converts again.
+        """
+        folder = os.path.dirname(os.path.abspath(out_file))
+        first_row, rows = data_rows or (1, [])
+
+        # Small template: an empty data sheet plus the new report sheets,
+        # with the styles / content types / rels that go with them
+        fd, template_path = tempfile.mkstemp(dir=folder, suffix=".xlsx")
+        os.close(fd)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".xlsx")
+        os.close(fd)
+        try:
+            with span(timer, "write tables"):
+                template = SheetWriter(template_path, data_sheet_name)
+                template.write_report(**(report or {}))
+                template.save()
+
+            with span(timer, "append rows", rows=len(rows), nbytes=os.path.getsize(out_file)) as s:
+                with zipfile.ZipFile(out_file) as old, zipfile.ZipFile(template_path) as tpl, \
+                        zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED, compresslevel=SPLICE_COMPRESSLEVEL) as new:
+                    if "xl/sharedStrings.xml" in old.namelist():
+                        raise WorkbookNotAppendable("Data workbook was saved by another program")
+                    old_part = _sheet_part(old, data_sheet_name)
+                    tpl_part = _sheet_part(tpl, data_sheet_name)
+                    for info in tpl.infolist():
+                        if info.filename == tpl_part:
+                            with old.open(old_part) as src, new.open(tpl_part, "w", force_zip64=True) as dst:
+                                _copy_sheet_data(src, dst, rows_xml(first_row, rows))
+                        else:
+                            new.writestr(info, tpl.read(info.filename))
+                os.replace(tmp_path, out_file)
+                s["bytes"] = os.path.getsize(out_file)
+        finally:
+            for path in (template_path, tmp_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def write_report(self, report_file, sheets=None, summary=None, end_tests=None, timer=None):
+        """Write fallout tables, the summary and End Test tables into the report workbook, one save.
+
+        The report workbook is small (tables only), so it is loaded and
+        saved whole. sheets is {sheet name: fallout table}, written at D3;
+        end_tests is {sheet name: reference rows}, written at H3 ([] clears
+        it). Sheets are updated in place: writing one table keeps the other
+        (e.g. a refreshed fallout table keeps the End Test table next to it).
+        timer is an optional RunTimer for the load / write / save spans.
+        """
+        sheets = sheets or {}
+        end_tests = end_tests or {}
+
+        if os.path.exists(report_file):
+            with span(timer, "load workbook", nbytes=os.path.getsize(report_file)):
+                wb = openpyxl.load_workbook(report_file)
+            default_sheet = None
+        else:
+            wb = openpyxl.Workbook()
+            default_sheet = wb.active
+
+        with span(timer, "write tables"):
+            styles = TableStyles(wb)
+            tables = [("Summary", summary, FALLOUT_ANCHOR, len(SUMMARY_HEADER), summary_cells)] if summary is not None else []
+            tables += [(name, table, FALLOUT_ANCHOR, 3, fallout_cells) for name, table in sheets.items()]
+            tables += [(name, rows, END_TEST_ANCHOR, len(CHECK_HEADER), end_test_cells) for name, rows in end_tests.items()]
+            for name, table, anchor, width, cells in tables:
+                ws = wb[name] if name in wb.sheetnames else wb.create_sheet(name)
+                clear_table(ws, anchor, width)
+                put_cells(ws, cells(styles, table))
+            if default_sheet is not None and len(wb.sheetnames) > 1:
+                wb.remove(default_sheet)
+
+        with span(timer, "save workbook") as s:
+            wb.save(report_file)
+            wb.close()
+            s["bytes"] = os.path.getsize(report_file)
+
+    def write_lot_table(self, out_file, header, rows, sheet_name="Lots"):
+        """Save the combined multi-lot table at D3 of a new workbook."""
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = sheet_name
+        put_cells(ws, lot_cells(TableStyles(wb), header, rows))
+
+        wb.save(out_file)
+        wb.close()
+
+    def close(self):
+        pass
+
+
+class XlwingsBackend(FileBackend):
+    """FileBackend plus the live Excel PivotTable, through xlwings.
+
+    One hidden Excel is started on first use and kept for the next calls
+    until close(). Like any COM object it must stay on the thread that
+    created it (the app's worker thread).
+    """
+
+    name = "xlwings"
+
+    def __init__(self):
+        self._app = None
+
+    def app(self, timer=None):
+        if self._app is None:
+            import xlwings as xw
+            try:
+                # COM has to be initialised on the worker thread
+                import pythoncom
+                pythoncom.CoInitialize()
+            except ImportError:
+                pass
+            with span(timer, "start Excel"):
+                self._app = xw.App(visible=False)
+        return self._app
+
+    def add_pivot_table(self, out_file, base_name, layout, selected, timer=None):
+        # Adds a live Excel PivotTable at A3 of the data workbook's Pivot sheet
+        # (requires Excel), where its source range is. Once Excel has saved
+        # the workbook, a refresh with new rows converts it again instead of
+        # splicing rows in, and the PivotTable is gone until it is added again.
+        wb_xlw = None
+        try:
+            app = self.app(timer)
+            with span(timer, "open in Excel", nbytes=os.path.getsize(out_file)):
+                wb_xlw = app.books.open(out_file)
+            sht = wb_xlw.sheets[base_name]
+            if "Pivot" in [s.name for s in wb_xlw.sheets]:
+                pivot_sheet = wb_xlw.sheets["Pivot"]
+            else:
+                pivot_sheet = wb_xlw.sheets.add("Pivot", after=sht)
+
+            # --- Define pivot source range (C1_MARK → ET, down to last row in Column G) ---
+            pivot_range = sht.range((layout.c1_mark_row, 7), (layout.data_last_row, layout.et_col))
+
+            pivot_rows = layout.data_last_row - layout.c1_mark_row
+            with span(timer, "PivotTable", rows=pivot_rows):
+                # --- Create pivot cache and table ---
+                pivot_cache = wb_xlw.api.PivotCaches().Create(
+                    SourceType=1,  # xlDatabase
+                    SourceData=pivot_range.api
+                )
+                table_name = f"PivotTable_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+                pivot_table = pivot_cache.CreatePivotTable(
+                    TableDestination=pivot_sheet.range("A3").api,
+                    TableName=table_name
+                )
+
+                # --- Filter: C1_MARK ---
+                pf = pivot_table.PivotFields("C1_MARK")
+                pf.Orientation = 3
+                pf.CurrentPage = selected
+
+                # --- Rows: ET ---
+                pivot_table.PivotFields("ET").Orientation = 1
+
+                # --- Values: Count of FT ---
+                pivot_table.AddDataField(
+                    pivot_table.PivotFields("FT"),
+                    "Count of FT",
+                    -4112  # xlCount
+                )
+
+            with span(timer, "save in Excel"):
+                wb_xlw.save()
+
+        except Exception:
+            # Excel may have been closed or crashed: start a fresh one next time
+            wb_xlw = None
+            self.close()
+            raise
+
+        finally:
+            if wb_xlw:
+                try: wb_xlw.close()
+                except: pass
+
+    def close(self):
+        if self._app is not None:
+            try: self._app.quit()
+            except: pass
+            self._app = None
+
+
+BACKENDS = {"file": FileBackend, "xlwings": XlwingsBackend}
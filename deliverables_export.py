@@ -0,0 +1,144 @@
+import csv
+import json
+import os
+import struct
+from array import array
+
+from deliverables_core import pivot_sort_key, theoretical_value
+
+# Deliverables Automation Tool — table exports
+# Author: Rose Anne Lafuente
+# Description: Writes the computed results of a run (fallout tables, End Test
+# reference rows, per-mark (C1_MARK, ET) counts) straight to CSV, JSON lines
+# or a columnar binary file, for dashboards that only need the numbers. No
+# workbook is built, so this costs next to nothing compared with the .xlsx.
+#
+# Columnar (.dcol) layout, little-endian and uncompressed so readers can map
+# the columns directly (e.g. numpy.frombuffer at each column's offset):
+#   b"DCL1", uint32 header length, JSON header
+#   {"version", "n", "columns": [{"name", "type"}], "symbols": [...]},
+#   then one buffer per column in header order: "int" = int64, "float" =
+#   float64, "str" = uint32 codes into "symbols".
+
+EXPORT_FORMATS = ("csv", "jsonl", "columnar")
+EXTENSIONS = {"csv": ".csv", "jsonl": ".jsonl", "columnar": ".dcol"}
+
+COLUMNAR_VERSION = 1
+COLUMNAR_MAGIC = b"DCL1"
+TYPECODES = {"int": "q", "float": "d", "str": "I"}
+
+FALLOUT_COLUMNS = [("c1_mark", "str"), ("end_test_no", "str"), ("count", "int"), ("fallout_pct", "float")]
+END_TEST_COLUMNS = [("c1_mark", "str"), ("tsno", "str"), ("testno", "str"), ("comment", "str"),
+                    ("mode", "str"), ("hilimit", "str"), ("lolimit", "str"), ("status", "str")]
+COUNT_COLUMNS = [("c1_mark", "str"), ("end_test_no", "str"), ("count", "int")]
+
+
+def report_tables(layout, counts, tables, checked):
+    """The three export tables as {name: (columns, rows)}.
+
+    tables is {C1_MARK: fallout table} (build_fallout_table), checked is
+    {C1_MARK: End Test rows with STATUS} (check_end_tests); counts is the
+    FalloutCounts of the file, limited to the marks in tables.
+    """
+    theoretical = theoretical_value(layout.theoretical_num)
+
+    fallout = []
+    for mark, fallout_table in tables.items():
+        for et, count, _ in fallout_table[:-1]:   # without Grand Total
+            fallout.append([mark, et, count, count / theoretical * 100 if theoretical else 0.0])
+
+    end_tests = [[mark] + list(row) for mark, rows in checked.items() for row in rows]
+
+    mark_counts = [
+        [mark, et, n] for (mark, et), n in sorted(
+            counts.counts.items(), key=lambda item: (pivot_sort_key(item[0][0]), pivot_sort_key(item[0][1]))
+        ) if mark in tables
+    ]
+
+    return {
+        "fallout": (FALLOUT_COLUMNS, fallout),
+        "end_tests": (END_TEST_COLUMNS, end_tests),
+        "counts": (COUNT_COLUMNS, mark_counts),
+    }
+
+
+def write_csv(path, columns, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow([name for name, _ in columns])
+        w.writerows(rows)
+
+
+def write_jsonl(path, columns, rows):
+    names = [name for name, _ in columns]
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(names, row))) + "\n")
+
+
+def write_columnar(path, columns, rows):
+    # One typed array per column; strings share one symbol table
+    symbols = {}
+    buffers = []
+    for c_idx, (name, kind) in enumerate(columns):
+        column = array(TYPECODES[kind])
+        if kind == "str":
+            column.extend(symbols.setdefault(str(row[c_idx]), len(symbols)) for row in rows)
+        else:
+            column.extend(row[c_idx] for row in rows)
+        buffers.append(column.tobytes())
+
+    header = json.dumps({
+        "version": COLUMNAR_VERSION,
+        "n": len(rows),
+        "columns": [{"name": name, "type": kind} for name, kind in columns],
+        "symbols": list(symbols),
+    }).encode("utf-8")
+
+    with open(path, "wb") as f:
+        f.write(COLUMNAR_MAGIC + struct.pack("<I", len(header)) + header)
+        for data in buffers:
+            f.write(data)
+
+
+def read_columnar(path):
+    """Inverse of write_columnar; returns {column name: list of values}."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar export file")
+
+    (header_len,) = struct.unpack_from("<I", data, 4)
+    header = json.loads(data[8:8 + header_len].decode("utf-8"))
+    if header.get("version") != COLUMNAR_VERSION:
+        raise ValueError("Columnar export version mismatch")
+
+    n, symbols = header["n"], header["symbols"]
+    offset = 8 + header_len
+    result = {}
+    for column_info in header["columns"]:
+        column = array(TYPECODES[column_info["type"]])
+        size = n * column.itemsize
+        column.frombytes(data[offset:offset + size])
+        offset += size
+        result[column_info["name"]] = [symbols[i] for i in column] if column_info["type"] == "str" else column.tolist()
+    return result
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "columnar": write_columnar}
+
+
+def export_report(folder, formats, export_tables):
+    """Write every table in every format as <folder>/<table><ext>; returns the paths."""
+    unknown = [fmt for fmt in formats if fmt not in WRITERS]
+    if unknown:
+        raise ValueError(f"Unknown export format(s) {unknown}; choose from {list(EXPORT_FORMATS)}")
+
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for fmt in formats:
+        for name, (columns, rows) in export_tables.items():
+            path = os.path.join(folder, name + EXTENSIONS[fmt])
+            WRITERS[fmt](path, columns, rows)
+            paths.append(path)
+    return paths
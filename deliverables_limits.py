@@ -0,0 +1,180 @@
+import argparse
+import sys
+
+import numpy as np
+
+from deliverables_core import (
+    ColumnStore,
+    FalloutCounts,
+    build_fallout_table,
+    convert_cell,
+    normalize_label,
+    parse_csv,
+    pivot_sort_key,
+)
+
+# Deliverables Automation Tool — parametric limit re-evaluation
+# Author: Rose Anne Lafuente
+# Description: Views the measurement columns of a tester CSV (parsed into a
+# ColumnStore) as NumPy arrays and re-bins every die against the reference
+# table's HILIMIT / LOLIMIT: a die's End Test is its first failing test in
+# TSNO order. With edited limits this gives "what-if" fallout without
+# rerunning the tester.
+# Requires NumPy (only this module does).
+#
+# Usage:
+#   python deliverables_limits.py <csv> [--limit TESTNO=LO:HI ...] [--mark C1_MARK]
+
+class MeasurementSet:
+    """The data block of one CSV as arrays, one entry per die.
+
+    Zero-copy views of a ColumnStore: values maps TESTNO → float64 readings
+    (NaN where blank); tests lists (TSNO, TESTNO) of the reference tests
+    that have a measurement column, in TSNO order. marks / ets / fts are the
+    C1_MARK, tester ET and FT codes per die into labels (code 0 = blank).
+    """
+
+    def __init__(self, layout, store, tests):
+        self.layout = layout
+        self.store = store
+        self.tests = tests
+        self.labels = store.symbols.labels
+        self.marks = np.frombuffer(store.codes["C1_MARK"], dtype=np.uintc)
+        self.ets = np.frombuffer(store.codes["ET"], dtype=np.uintc)
+        self.fts = np.frombuffer(store.codes["FT"], dtype=np.uintc)
+        columns = {normalize_label(convert_cell(name)): name for name in store.numeric}
+        self.values = {
+            testno: np.frombuffer(store.numeric[columns[testno]], dtype=np.float64)
+            for _, testno in tests
+        }
+
+    def __len__(self):
+        return len(self.marks)
+
+
+def reference_limits(layout):
+    """{TESTNO: (TSNO, LOLIMIT, HILIMIT)} from the reference table; None = no limit."""
+    limits = {}
+    for tsno, testno, _, _, hilimit, lolimit in layout.reference.rows.values():
+        lo, hi = convert_cell(lolimit), convert_cell(hilimit)
+        limits[testno] = (
+            tsno,
+            float(lo) if isinstance(lo, (int, float)) else None,
+            float(hi) if isinstance(hi, (int, float)) else None,
+        )
+    return limits
+
+
+def load_measurements(file_path):
+    """One pass over file_path into a MeasurementSet."""
+    store = ColumnStore()
+    layout, _, _ = parse_csv(file_path, store=store)
+    if layout.c1_mark_row is None:
+        raise ValueError("First non-empty cell in Column G is not 'C1_MARK'")
+    if not layout.et_col or not layout.ft_col:
+        raise ValueError("'ET'/'FT' columns not found to the right of C1_MARK")
+
+    # Measurement columns: headers that are a TESTNO of the reference table, in TSNO order
+    limits = reference_limits(layout)
+    headers = {normalize_label(convert_cell(name)) for name in store.numeric}
+    tests = sorted(
+        ((limits[testno][0], testno) for testno in limits if testno in headers),
+        key=lambda t: pivot_sort_key(t[0])
+    )
+    return MeasurementSet(layout, store, tests)
+
+
+def first_failing_test(ms, limits):
+    """Index into ms.tests of each die's first failing test, -1 if it passes.
+
+    limits is {TESTNO: (TSNO, LOLIMIT, HILIMIT)}; a missing bound never fails.
+    One vectorized comparison per test, only over dies not failed yet.
+    """
+    first = np.full(len(ms), -1, dtype=np.int32)
+    for k, (_, testno) in enumerate(ms.tests):
+        _, lo, hi = limits.get(testno, (None, None, None))
+        if lo is None and hi is None:
+            continue
+        readings = ms.values[testno]
+        with np.errstate(invalid="ignore"):
+            fail = np.zeros(len(ms), dtype=bool)
+            if lo is not None:
+                fail |= readings < lo
+            if hi is not None:
+                fail |= readings > hi
+        first[fail & (first < 0)] = k
+    return first
+
+
+def _counts_from_codes(mark_codes, et_codes, mark_labels, et_labels):
+    # bincount over (mark, ET) pairs → FalloutCounts
+    n_et = len(et_labels)
+    pairs = np.bincount(mark_codes.astype(np.int64) * n_et + et_codes.astype(np.int64),
+                        minlength=len(mark_labels) * n_et)
+    counts = FalloutCounts()
+    for pair in np.flatnonzero(pairs):
+        mark, et = mark_labels[pair // n_et], et_labels[pair % n_et]
+        counts.counts[(mark, et)] = int(pairs[pair])
+    return counts
+
+
+def rebin(ms, overrides=None):
+    """What-if (C1_MARK, End Test No.) counts with the reference limits, edited by overrides.
+
+    overrides is {TESTNO: (LOLIMIT, HILIMIT)}; None removes that bound.
+    """
+    limits = reference_limits(ms.layout)
+    for testno, (lo, hi) in (overrides or {}).items():
+        tsno = limits.get(normalize_label(testno), ("", None, None))[0]
+        limits[normalize_label(testno)] = (tsno, lo, hi)
+
+    first = first_failing_test(ms, limits)
+    failed = first >= 0
+    testnos = [testno for _, testno in ms.tests]
+    return _counts_from_codes(ms.marks[failed], first[failed], ms.labels, testnos)
+
+
+def tester_counts(ms):
+    """The tester's own (C1_MARK, ET) counts, same rules as FalloutCounts."""
+    keep = (ms.fts != 0) & (ms.ets != 0)
+    return _counts_from_codes(ms.marks[keep], ms.ets[keep], ms.labels, ms.labels)
+
+
+def parse_limit(text):
+    # "1010=0.5:1.5" → ("1010", (0.5, 1.5)); an empty side means no limit
+    testno, _, bounds = text.partition("=")
+    lo, _, hi = bounds.partition(":")
+    return normalize_label(testno), (float(lo) if lo.strip() else None, float(hi) if hi.strip() else None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-bin dies against (edited) HILIMIT / LOLIMIT values.")
+    parser.add_argument("csv", help="tester CSV")
+    parser.add_argument("--limit", action="append", default=[], metavar="TESTNO=LO:HI",
+                        help="override a test's limits (repeatable); leave a side empty for no limit")
+    parser.add_argument("--mark", default=None, help="only this C1_MARK (default: every mark)")
+    args = parser.parse_args(argv)
+
+    ms = load_measurements(args.csv)
+    overrides = dict(parse_limit(text) for text in args.limit)
+    tester = tester_counts(ms).by_mark()
+    what_if = rebin(ms, overrides).by_mark()
+    theoretical = ms.layout.theoretical_num
+
+    marks = [args.mark] if args.mark else ms.layout.c1_marks
+    for mark in marks:
+        before = tester.get(mark, {})
+        table = build_fallout_table(what_if.get(mark, {}), theoretical)
+        print(f"\nC1_MARK {mark}: {len(ms.tests)} tests re-evaluated, {len(overrides)} limits edited")
+        print(f"{'End Test No.':<15}{'Tester':<10}{'What-if':<10}{'Fallout%'}")
+        print("-" * 45)
+        for et, count, fallout in table[:-1]:
+            print(f"{et:<15}{before.get(et, 0):<10}{count:<10}{fallout}")
+        for et in sorted(set(before) - {row[0] for row in table}, key=pivot_sort_key):
+            print(f"{et:<15}{before[et]:<10}{0:<10}0.00%")
+        print(f"{'Total':<15}{sum(before.values()):<10}{sum(row[1] for row in table[:-1]):<10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
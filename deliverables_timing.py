@@ -0,0 +1,142 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+# Deliverables Automation Tool — run timing
+# Author: Rose Anne Lafuente
+# Description: Timing spans around each stage of a run (CSV parsing, workbook
+# load/save, starting Excel, PivotTable, lookups) with row / byte counts and
+# peak memory. Each finished run is appended as one JSON line to a log file,
+# so slow stages and regressions between versions can be tracked.
+
+DEFAULT_RUN_LOG = os.environ.get(
+    "DELIVERABLES_RUN_LOG",
+    os.path.join(os.path.expanduser("~"), ".deliverables_runs.jsonl")
+)
+
+
+def _windows_peak_rss():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    kernel32 = ctypes.WinDLL("kernel32")
+    psapi = ctypes.WinDLL("psapi")
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize / (1024 * 1024)
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None if it can't be read."""
+    try:
+        if sys.platform == "win32":
+            peak = _windows_peak_rss()
+        else:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # Linux reports KB, macOS bytes
+            peak /= 1024 * 1024 if sys.platform == "darwin" else 1024
+    except Exception:
+        return None
+    return round(peak, 1) if peak is not None else None
+
+
+def span(timer, stage, **counts):
+    """timer.span(...) or a do-nothing context when no timer is given."""
+    return timer.span(stage, **counts) if timer is not None else nullcontext({})
+
+
+class RunTimer:
+    """Timing spans of one run (e.g. convert_to_excel).
+
+    Use as
+        with timer.span("parse", nbytes=size) as s:
+            ...
+            s["rows"] = row_count
+    Spans may be opened from the Tk thread and the worker thread alike.
+    """
+
+    def __init__(self, action, file_path=None):
+        self.action = action
+        self.file_path = file_path
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.spans = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage, rows=None, nbytes=None):
+        entry = {"stage": stage, "rows": rows, "bytes": nbytes}
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry["seconds"] = round(time.perf_counter() - start, 4)
+            entry["peak_rss_mb"] = peak_rss_mb()
+            self.spans.append(entry)
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self._start
+
+    def summary(self):
+        # One line for the status box, e.g. "⏱ convert: parse + write 2.31s (120,000 rows, 14.2 MB) · save 0.40s · total 2.80s · peak 85 MB"
+        parts = []
+        for entry in self.spans:
+            detail = []
+            if entry["rows"] is not None:
+                detail.append(f"{entry['rows']:,} rows")
+            if entry["bytes"] is not None:
+                detail.append(f"{entry['bytes'] / (1024 * 1024):.1f} MB")
+            extra = f" ({', '.join(detail)})" if detail else ""
+            parts.append(f"{entry['stage']} {entry['seconds']:.2f}s{extra}")
+        parts.append(f"total {self.seconds:.2f}s")
+        peak = peak_rss_mb()
+        if peak is not None:
+            parts.append(f"peak {peak:,.0f} MB")
+        return f"⏱ {self.action}: " + " · ".join(parts)
+
+    def record(self, status="ok", error=None):
+        from deliverables_core import __version__
+        record = {
+            "time": self.started,
+            "version": __version__,
+            "action": self.action,
+            "file": self.file_path,
+            "status": status,
+            "seconds": round(self.seconds, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": self.spans,
+        }
+        if error is not None:
+            record["error"] = str(error)
+        return record
+
+    def append_log(self, status="ok", error=None, log_path=None):
+        # Logging is best effort; a read-only home folder must not fail the run
+        try:
+            with open(log_path or DEFAULT_RUN_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.record(status, error)) + "\n")
+        except OSError:
+            pass
@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from deliverables_cache import DatasetCache, content_hash
+from deliverables_core import process_file
+
+# Deliverables Automation Tool — watch-folder ingest
+# Author: Rose Anne Lafuente
+# Description: Long-running mode for a shared drop folder. New tester CSVs
+# are picked up once they stop growing, duplicates (same content under any
+# name) are skipped by content hash, and the rest are queued to a bounded
+# worker pool running the convert → fallout → End Test pipeline. The .xlsx
+# and a <name>.status.json manifest are written next to each input.
+#
+# Usage:
+#   python deliverables_watch.py <folder> [--workers N] [--poll 2] [--settle 5]
+#                                [--top-n N] [--no-cache] [--once]
+
+INDEX_NAME = ".deliverables_watch.json"
+MANIFEST_SUFFIX = ".status.json"
+# Content hashed for duplicate detection per scan; the rest waits for the next one
+HASH_BYTES_PER_SCAN = 256 * 1024 * 1024
+
+
+def manifest_path(file_path):
+    return os.path.splitext(file_path)[0] + MANIFEST_SUFFIX
+
+
+def write_json_atomic(path, data):
+    # Readers never see a half-written manifest
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _lower_priority():
+    # Worker initializer: keep the machine responsive during a burst. Ctrl+C
+    # is handled by the main process, which lets running files finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(os, "nice"):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+
+
+class FolderWatcher:
+    """Polls one folder and feeds finished, not yet seen CSVs to a process pool.
+
+    A file is "finished" once its size and mtime have not changed for
+    settle_seconds and it can be opened. Finished files are hashed (for
+    duplicates) up to HASH_BYTES_PER_SCAN per scan, so a burst does not
+    stall the loop. At most max_pending files are handed to the pool at a
+    time; the rest wait in a queue, so a burst of hundreds of files costs
+    only memory for their paths.
+    The content-hash index lives in the folder (INDEX_NAME), so a restart
+    does not reprocess anything.
+    """
+
+    def __init__(self, folder, workers=None, poll_seconds=2.0, settle_seconds=5.0,
+                 top_n=1, cache=None, max_pending=None, on_event=None):
+        self.folder = os.path.abspath(folder)
+        self.workers = workers or max((os.cpu_count() or 2) - 1, 1)
+        self.max_pending = max_pending or self.workers * 2
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.top_n = top_n
+        self.cache = cache
+        self.on_event = on_event or (lambda event, file_path, detail: None)
+
+        self.index_path = os.path.join(self.folder, INDEX_NAME)
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                self.index = json.load(f)   # content hash → {file, status, finished}
+        except (OSError, ValueError):
+            self.index = {}
+
+        self.pending = {}      # path → (size, mtime_ns, last change time) while settling
+        self.handled = {}      # path → (size, mtime_ns) already queued or skipped
+        self.settled = deque()  # (path, size) finished, waiting to be hashed
+        self.queue = deque()   # (path, hash) waiting for a pool slot
+        self.running = {}      # future → (path, hash)
+
+    # --- Discovery ---
+    def scan(self):
+        """Move files that stopped changing from pending to the work queue."""
+        now = time.monotonic()
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return
+
+        for name in names:
+            if not name.lower().endswith(".csv"):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stamp = (st.st_size, st.st_mtime_ns)
+            if self.handled.get(path) == stamp:
+                continue
+
+            previous = self.pending.get(path)
+            if previous is None or previous[:2] != stamp:
+                self.pending[path] = stamp + (now,)
+                continue
+            if now - previous[2] < self.settle_seconds or not self._can_open(path):
+                continue
+
+            del self.pending[path]
+            self.handled[path] = stamp
+            self.settled.append((path, st.st_size))
+
+        # Always at least one file, however big
+        budget = HASH_BYTES_PER_SCAN
+        while self.settled and budget > 0:
+            path, size = self.settled.popleft()
+            budget -= size
+            self._enqueue(path)
+
+    @staticmethod
+    def _can_open(path):
+        # The tester may still hold the file open exclusively (Windows)
+        try:
+            with open(path, "rb"):
+                return True
+        except OSError:
+            return False
+
+    def _enqueue(self, path):
+        try:
+            digest = content_hash(path, full=True)
+        except OSError as e:
+            self._finish(path, None, {"status": "error", "error": str(e)})
+            return
+
+        seen = self.index.get(digest)
+        if seen is not None and seen["file"] == path and seen["status"] == "ok":
+            # Processed before a restart; its manifest is already final
+            self.on_event("unchanged", path, None)
+            return
+        if seen is not None and seen["status"] in ("queued", "ok"):
+            self._write_manifest(path, {"status": "duplicate", "hash": digest, "duplicate_of": seen["file"]})
+            self.on_event("duplicate", path, seen["file"])
+            return
+
+        self.index[digest] = {"file": path, "status": "queued"}
+        self._write_manifest(path, {"status": "queued", "hash": digest})
+        self.queue.append((path, digest))
+        self.on_event("queued", path, None)
+
+    # --- Work ---
+    def submit(self, pool):
+        while self.queue and len(self.running) < self.max_pending:
+            path, digest = self.queue.popleft()
+            self._write_manifest(path, {"status": "processing", "hash": digest})
+            future = pool.submit(process_file, path, None, None, self.top_n, self.cache)
+            self.running[future] = (path, digest)
+
+    def collect(self, timeout):
+        # Waits up to timeout for a job to finish; doubles as the poll interval
+        if not self.running:
+            time.sleep(timeout)
+            return
+        done, _ = wait(self.running, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            path, digest = self.running.pop(future)
+            try:
+                result = future.result()
+            except BaseException as e:   # worker process died or was interrupted
+                result = {"file": path, "status": "error", "error": str(e) or type(e).__name__}
+            self._finish(path, digest, result)
+
+    def _finish(self, path, digest, result):
+        status = result["status"]
+        if digest is not None:
+            self.index[digest] = {"file": path, "status": status, "finished": _now()}
+            self._save_index()
+        self._write_manifest(path, dict(result, hash=digest))
+        self.on_event(status, path, result.get("error") or result.get("out_file"))
+
+    def _write_manifest(self, path, data):
+        try:
+            write_json_atomic(manifest_path(path), dict(data, file=path, updated=_now()))
+        except OSError:
+            pass
+
+    def _save_index(self):
+        try:
+            write_json_atomic(self.index_path, self.index)
+        except OSError:
+            pass
+
+    def busy(self):
+        return bool(self.pending or self.settled or self.queue or self.running)
+
+    def run(self, once=False):
+        """Watch until interrupted (Ctrl+C), or with once=True until the folder is drained."""
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_lower_priority) as pool:
+            try:
+                while True:
+                    self.scan()
+                    self.submit(pool)
+                    self.collect(self.poll_seconds)
+                    if once and not self.busy():
+                        return
+            except KeyboardInterrupt:
+                # Let running files finish; queued ones are picked up again on restart
+                self.on_event("stopping", self.folder, f"{len(self.running)} running")
+                for path, digest in self.queue:
+                    self.index.pop(digest, None)
+                    self._write_manifest(path, {"status": "interrupted", "hash": digest})
+                self.queue.clear()
+                while self.running:
+                    self.collect(self.poll_seconds)
+                self._save_index()
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def print_event(event, file_path, detail):
+    suffix = f" ({detail})" if detail else ""
+    print(f"{_now()} [{event}] {file_path}{suffix}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch a drop folder and process new tester CSVs.")
+    parser.add_argument("folder", help="drop folder to watch")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores but one)")
+    parser.add_argument("--poll", type=float, default=2.0, help="seconds between folder scans")
+    parser.add_argument("--settle", type=float, default=5.0, help="seconds a file must stay unchanged before it is processed")
+    parser.add_argument("--top-n", type=int, default=1, help="End Test Nos. to check per fallout table (0 = all)")
+    parser.add_argument("--no-cache", action="store_true", help="always re-parse, don't use the dataset cache")
+    parser.add_argument("--cache-dir", default=None, help="dataset cache folder (default: ~/.deliverables_cache)")
+    parser.add_argument("--once", action="store_true", help="process what is in the folder now, then exit")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.folder):
+        print(f"Not a folder: {args.folder}", file=sys.stderr)
+        return 2
+
+    cache = None if args.no_cache else DatasetCache(args.cache_dir)
+    watcher = FolderWatcher(args.folder, args.workers, args.poll, args.settle, args.top_n, cache,
+                            on_event=print_event)
+    print_event("watching", watcher.folder, f"{watcher.workers} workers")
+    watcher.run(once=args.once)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
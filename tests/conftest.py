@@ -0,0 +1,69 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Deliverables Automation Tool — test fixtures
+# Author: Rose Anne Lafuente
+# Description: Generated tester CSVs shared by the tests (header block,
+# reference table, C1_MARK data block), with switches for the layouts that
+# need care.
+
+TESTNOS = [1010, 1020, 1030, 1040, 1050, 1060]
+MARKS = ["MA1", "MB1", "MC1", "MD1"]
+
+
+def write_lot(path, rows=3000, seed=7, quoted_comment=False, quoted_note=False, late_theoretical=False,
+              trailer=False):
+    """Write a tester CSV: header block, reference table, C1_MARK data block.
+
+    quoted_note puts a quoted line break in the NOTE column of every die.
+    """
+    rng = random.Random(seed)
+    lines = []
+    if not late_theoretical:
+        lines.append("THEORETICAL_NUM,,5000")
+    lines += ["LOT_ID,,TEST0001", "", "TSNO,TESTNO,COMMENT,MODE,HILIMIT,LOLIMIT"]
+    for i, testno in enumerate(TESTNOS, start=1):
+        comment = f'"TEST_{i}\nsecond line, with comma"' if quoted_comment and i == 2 else f"TEST_{i}"
+        limits = ",," if i % 5 == 0 else f"{i + 0.5},{i - 0.5}"
+        lines.append(f"{i},{testno},{comment},V,{limits}")
+    lines.append("")
+
+    lines.append("DIE,X,Y,SITE,HBIN,SBIN,C1_MARK,FT,ET," + ",".join(map(str, TESTNOS)) + ",NOTE")
+    for die in range(rows):
+        mark = rng.choice(MARKS)
+        roll = rng.random()
+        if roll < 0.6:
+            ft, et = "", ""
+        elif roll < 0.65:
+            ft, et = " ", rng.choice(TESTNOS)       # whitespace FT still counts
+        elif roll < 0.7:
+            ft, et = rng.randint(2, 30), f"{rng.choice(TESTNOS)}.0"
+        else:
+            ft, et = rng.randint(2, 30), rng.choice(TESTNOS)
+        values = ",".join(f"{rng.uniform(0, 5):.4f}" for _ in TESTNOS)
+        note = f'"probe {die}\nre-tested, ok"' if quoted_note else ""
+        lines.append(f"{die},{die % 50},{die // 50},{die % 4},1,1,{mark},{ft},{et},{values},{note}")
+
+    if trailer:
+        # Data block ends mid-file; rows after the blank Column G are not data
+        lines.append("")
+        lines += [f"SUMMARY,{i},,,,,MA1,5,1010" for i in range(400)]
+    if late_theoretical:
+        lines += ["", "THEORETICAL_NUM,,5000"]
+
+    with open(path, "w", newline="") as f:
+        f.write("\r\n".join(lines) + "\r\n")
+    return path
+
+
+@pytest.fixture
+def make_lot(tmp_path):
+    """make_lot(name, **options) → path of a generated CSV in tmp_path (see write_lot)."""
+    def make(name="lot.csv", **options):
+        return write_lot(tmp_path / name, **options)
+    return make
@@ -0,0 +1,33 @@
+from deliverables_cache import DatasetCache
+from deliverables_core import parse_csv
+from test_parsing import layout_fields
+
+# Deliverables Automation Tool — dataset cache tests
+# Author: Rose Anne Lafuente
+# Description: A cached dataset must give back the layout, counts and row
+# count parse_csv built, and a changed CSV must miss.
+#
+# Usage:
+#   python -m pytest -q
+
+
+def test_dataset_cache_round_trip(make_lot, tmp_path):
+    path = make_lot("lot.csv")
+    layout, counts, row_count = parse_csv(path)
+    cache = DatasetCache(str(tmp_path / "cache"))
+    assert cache.get(path) is None
+
+    cache.put(path, layout, counts, row_count)
+    cached_layout, cached_counts, cached_rows = cache.get(path)
+    assert cached_rows == row_count
+    assert cached_counts.counts == counts.counts
+    assert layout_fields(cached_layout) == layout_fields(layout)
+
+
+def test_changed_csv_misses(make_lot, tmp_path):
+    path = make_lot("lot.csv")
+    cache = DatasetCache(str(tmp_path / "cache"))
+    cache.put(path, *parse_csv(path))
+    with open(path, "ab") as f:
+        f.write(b"9999,1,1,0,1,1,MA1,5,1010,1,1,1,1,1,1,\r\n")
+    assert cache.get(path) is None
@@ -0,0 +1,25 @@
+from deliverables_core import ColumnStore, SymbolTable, parse_csv
+
+# Deliverables Automation Tool — column store tests
+# Author: Rose Anne Lafuente
+# Description: The columnar data block must count fallout exactly like
+# FalloutCounts does on the rows, whitespace-only FT cells included.
+#
+# Usage:
+#   python -m pytest -q
+
+
+def test_column_store_counts_match(make_lot):
+    store = ColumnStore()
+    layout, counts, _ = parse_csv(make_lot("lot.csv"), store=store)
+    assert store.fallout_counts().counts == counts.counts
+    assert len(store) == layout.data_last_row - layout.c1_mark_row == 3000
+    assert store.nbytes == 3000 * (3 * 4 + (len(layout.columns) - 3) * 8)
+
+
+def test_blank_and_whitespace_codes():
+    symbols = SymbolTable()
+    assert symbols.encode(None) == symbols.encode("") == 0
+    space = symbols.encode(" ")
+    assert space != 0 and symbols.encode(" ") == space
+    assert symbols.labels[space] == ""
@@ -0,0 +1,72 @@
+import openpyxl
+
+from deliverables_core import STATUS_LIMITS, STATUS_NO_LIMIT, STATUS_NOT_FOUND
+from deliverables_excel import FileBackend
+
+# Deliverables Automation Tool — report workbook tests
+# Author: Rose Anne Lafuente
+# Description: FileBackend.write_report updates the small report workbook in
+# place: each table is cleared before it is rewritten, the table next to it
+# is left alone, and every cell carries its named style.
+#
+# Usage:
+#   python -m pytest -q
+
+FALLOUT = [["1010", 9, 0.18], ["1030", 4, 0.08], ["1040", 1, 0.02], ["Grand Total", 14, 0.28]]
+CHECKED = [
+    ["1", "1010", "TEST_1", "V", "1.5", "0.5", STATUS_LIMITS],
+    ["", "1020", "", "", "", "", STATUS_NOT_FOUND],
+    ["3", "1030", "TEST_3", "V", "", "", STATUS_NO_LIMIT],
+    ["4", "1040", "TEST_4", "I", "3.0", "2.0", STATUS_LIMITS],
+]
+
+
+def column(ws, col, first_row=3, last_row=10):
+    return [ws.cell(row=r, column=col).value for r in range(first_row, last_row + 1)]
+
+
+def test_end_test_table_rewrite_clears_past_not_found_rows(tmp_path):
+    report_file = str(tmp_path / "lot_report.xlsx")
+    backend = FileBackend()
+    backend.write_report(report_file, sheets={"Pivot": FALLOUT}, end_tests={"Pivot": CHECKED})
+
+    backend.write_report(report_file, end_tests={"Pivot": CHECKED[:1]})
+    ws = openpyxl.load_workbook(report_file)["Pivot"]
+    assert column(ws, 9) == ["TESTNO", "1010"] + [None] * 6        # I: TESTNO
+    assert column(ws, 14) == ["STATUS", STATUS_LIMITS] + [None] * 6
+    assert ws["H5"].style == "Normal"
+
+    backend.write_report(report_file, end_tests={"Pivot": []})
+    ws = openpyxl.load_workbook(report_file)["Pivot"]
+    assert all(value is None for c in range(8, 15) for value in column(ws, c))
+    assert column(ws, 4)[:5] == ["End Test No.", "1010", "1030", "1040", "Grand Total"]    # fallout kept
+
+
+def test_fallout_rewrite_keeps_end_tests_and_styles(tmp_path):
+    report_file = str(tmp_path / "lot_report.xlsx")
+    backend = FileBackend()
+    backend.write_report(report_file, sheets={"Pivot": FALLOUT}, end_tests={"Pivot": CHECKED})
+    backend.write_report(report_file, sheets={"Pivot": [["1050", 2, 0.04], ["Grand Total", 2, 0.04]]})
+
+    wb = openpyxl.load_workbook(report_file)
+    assert wb.sheetnames == ["Pivot"]
+    ws = wb["Pivot"]
+    assert column(ws, 4) == ["End Test No.", "1050", "Grand Total"] + [None] * 5
+    assert column(ws, 9)[:5] == ["TESTNO", "1010", "1020", "1030", "1040"]
+
+    assert ws["D3"].style == "Deliverables header LT"
+    assert ws["D4"].style == "Deliverables highlight L"
+    assert ws["F5"].style == "Deliverables total RB"
+    assert ws["N5"].style == "Deliverables not_found R"
+    assert ws["N6"].style == "Deliverables no_limit R"
+    assert ws["N7"].style == "Deliverables cell RB"
+
+
+def test_summary_and_fallout_sheets(tmp_path):
+    report_file = str(tmp_path / "lot_report.xlsx")
+    summary = [["MA1", 14, 0.28, "1010", 9]]
+    FileBackend().write_report(report_file, sheets={"Pivot_MA1": FALLOUT}, summary=summary)
+
+    wb = openpyxl.load_workbook(report_file)
+    assert wb.sheetnames == ["Summary", "Pivot_MA1"]
+    assert [c.value for c in wb["Summary"][4][3:8]] == summary[0]
@@ -0,0 +1,43 @@
+import os
+import shutil
+
+from deliverables_batch import collect_csv_files
+from deliverables_core import process_file
+from deliverables_export import read_columnar, write_columnar
+
+# Deliverables Automation Tool — export tests
+# Author: Rose Anne Lafuente
+# Description: The .dcol columnar files read back as written, and the tables
+# exported next to a workbook are not taken for tester CSVs by the next run,
+# while a folder that only happens to be named *_export still is.
+#
+# Usage:
+#   python -m pytest -q
+
+
+def test_columnar_round_trip(tmp_path):
+    columns = [("c1_mark", "str"), ("count", "int"), ("fallout_pct", "float")]
+    rows = [["MA1", 3, 0.06], ["MB1", 0, 0.0], ["MA1", 12, 0.24]]
+    path = tmp_path / "fallout.dcol"
+    write_columnar(path, columns, rows)
+    assert read_columnar(path) == {
+        "c1_mark": ["MA1", "MB1", "MA1"],
+        "count": [3, 0, 12],
+        "fallout_pct": [0.06, 0.0, 0.24],
+    }
+
+
+def test_collect_skips_only_export_folders(make_lot, tmp_path):
+    lot = str(make_lot("lot.csv"))
+    result = process_file(lot, exports=("csv",))
+    assert result["status"] == "ok"
+    assert os.path.isfile(os.path.join(tmp_path, "lot_export", "fallout.csv"))
+
+    final = tmp_path / "final_export"
+    final.mkdir()
+    other = str(final / "other.csv")
+    shutil.copy(lot, other)
+
+    pattern = os.path.join(tmp_path, "**", "*.csv")
+    assert collect_csv_files([pattern]) == [other, lot]
+    assert collect_csv_files([str(final)]) == [other]
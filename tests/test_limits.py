@@ -0,0 +1,82 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from deliverables_core import normalize_label, parse_csv    # noqa: E402
+from deliverables_limits import (                             # noqa: E402
+    first_failing_test, load_measurements, rebin, reference_limits, tester_counts as counts_from_tester
+)
+
+# Deliverables Automation Tool — limit re-evaluation tests
+# Author: Rose Anne Lafuente
+# Description: The vectorized re-binning in deliverables_limits must pick the
+# same first failing test per die as checking each die's readings one test
+# at a time, and an edited limit must move the counts the expected way.
+#
+# Usage:
+#   python -m pytest -q
+
+
+def data_rows(path, layout):
+    rows = []
+    parse_csv(path, rows.append)
+    return rows[layout.c1_mark_row:layout.data_last_row]
+
+
+def expected_first_fail(ms, rows, limits):
+    # Die by die, test by test in TSNO order
+    columns = {normalize_label(name): col - 1 for name, col in ms.layout.columns.items()}
+    first = []
+    for values in rows:
+        k = -1
+        for i, (_, testno) in enumerate(ms.tests):
+            _, lo, hi = limits[testno]
+            reading = values[columns[testno]]
+            if (lo is not None and reading < lo) or (hi is not None and reading > hi):
+                k = i
+                break
+        first.append(k)
+    return first
+
+
+def test_first_failing_test_matches_die_by_die(make_lot):
+    path = make_lot("lot.csv")
+    ms = load_measurements(path)
+    limits = reference_limits(ms.layout)
+    assert len(ms) == 3000
+    assert [testno for _, testno in ms.tests] == ["1010", "1020", "1030", "1040", "1050", "1060"]
+
+    first = first_failing_test(ms, limits)
+    assert first.tolist() == expected_first_fail(ms, data_rows(path, ms.layout), limits)
+    assert len(set(first.tolist())) > 1
+
+
+def test_rebin_counts(make_lot):
+    path = make_lot("lot.csv")
+    ms = load_measurements(path)
+    rows = data_rows(path, ms.layout)
+    first = expected_first_fail(ms, rows, reference_limits(ms.layout))
+
+    expected = {}
+    for values, k in zip(rows, first):
+        if k >= 0:
+            key = (values[6], ms.tests[k][1])
+            expected[key] = expected.get(key, 0) + 1
+    assert rebin(ms).counts == expected
+
+    # 1010 failing every die: each mark's dies all end at 1010
+    dies = {}
+    for values in rows:
+        dies[values[6]] = dies.get(values[6], 0) + 1
+    assert rebin(ms, {"1010": (10.0, None)}).counts == {(mark, "1010"): n for mark, n in dies.items()}
+
+    no_limits = {testno: (None, None) for _, testno in ms.tests}
+    assert rebin(ms, no_limits).counts == {}
+
+
+def test_lot_without_data_rows(make_lot):
+    ms = load_measurements(make_lot("empty.csv", rows=0))
+    assert len(ms) == 0 and len(ms.tests) == 6
+    assert first_failing_test(ms, reference_limits(ms.layout)).tolist() == []
+    assert rebin(ms).counts == {}
+    assert counts_from_tester(ms).counts == {}
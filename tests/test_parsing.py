@@ -0,0 +1,102 @@
+import math
+import os
+
+import pytest
+
+import deliverables_core
+from deliverables_core import convert_cell, convert_rows, parse_csv, parse_parallel
+
+# Deliverables Automation Tool — parsing tests
+# Author: Rose Anne Lafuente
+# Description: parse_parallel must give exactly what parse_csv gives, on a
+# generated tester CSV and on the layouts that trip up chunked parsing.
+# A small chunk size makes the process pool run even on small files
+# (the generated lots come from conftest.make_lot).
+#
+# Usage:
+#   python -m pytest -q
+
+CHUNK = 4096
+
+
+def layout_fields(layout):
+    return {
+        "theoretical_row": layout.theoretical_row,
+        "theoretical_num": layout.theoretical_num,
+        "c1_mark_row": layout.c1_mark_row,
+        "data_last_row": layout.data_last_row,
+        "c1_marks": layout.c1_marks,
+        "columns": layout.columns,
+        "et_col": layout.et_col,
+        "ft_col": layout.ft_col,
+        "reference": layout.reference.rows,
+    }
+
+
+def assert_same_parse(path, monkeypatch):
+    layout, counts, row_count = parse_csv(path)
+
+    def no_fallback(*args, **kwargs):
+        raise AssertionError("parse_parallel fell back to parse_csv")
+
+    with monkeypatch.context() as m:
+        m.setattr(deliverables_core, "parse_csv", no_fallback)
+        p_layout, p_counts, p_row_count = parse_parallel(path, workers=4, chunk_bytes=CHUNK)
+    assert p_row_count == row_count
+    assert p_counts.counts == counts.counts
+    assert layout_fields(p_layout) == layout_fields(layout)
+    return layout, counts
+
+
+# --- parse_parallel vs parse_csv ---
+def test_parallel_matches_sequential(make_lot, monkeypatch):
+    path = make_lot("lot.csv")
+    layout, counts = assert_same_parse(path, monkeypatch)
+    assert layout.c1_marks and counts.counts
+    assert os.path.getsize(path) > 8 * CHUNK    # really ran in chunks
+
+
+def test_quoted_newline_in_header(make_lot, monkeypatch):
+    layout, _ = assert_same_parse(make_lot("quoted.csv", quoted_comment=True), monkeypatch)
+    assert layout.reference.lookup(1020)[2] == "TEST_2\nsecond line, with comma"
+
+
+def test_quoted_newline_in_data_block(make_lot):
+    # Chunks can't be cut safely: the result must still be the sequential one
+    path = make_lot("notes.csv", quoted_note=True)
+    layout, counts, row_count = parse_csv(path)
+    p_layout, p_counts, p_row_count = parse_parallel(path, workers=4, chunk_bytes=CHUNK)
+    assert (p_row_count, p_counts.counts) == (row_count, counts.counts)
+    assert layout_fields(p_layout) == layout_fields(layout)
+    assert layout.data_last_row == layout.c1_mark_row + 3000
+
+
+def test_late_theoretical_num(make_lot, monkeypatch):
+    layout, _ = assert_same_parse(make_lot("late.csv", late_theoretical=True), monkeypatch)
+    assert layout.theoretical_num == 5000
+    assert layout.theoretical_row > layout.data_last_row
+
+
+def test_data_block_ends_mid_file(make_lot, monkeypatch):
+    layout, counts = assert_same_parse(make_lot("trailer.csv", trailer=True), monkeypatch)
+    assert layout.data_last_row == layout.c1_mark_row + 3000
+    assert ("MA1", "1010") in counts.counts
+
+
+# --- Block conversion vs the cell-by-cell rules ---
+@pytest.mark.parametrize("rows", [
+    [["1", "2.5", "abc", ""], ["10", "-3", " 7", "nan"], ["0", "1e3", "1010.0", "x"]],
+    [["1", "2"], ["3"]],                  # ragged: row by row
+    [[]],
+])
+def test_convert_rows_matches_convert_cell(rows):
+    expected = [[convert_cell(value) for value in row] for row in rows]
+    result = convert_rows(rows)
+    assert len(result) == len(expected)
+    for got, want in zip(result, expected):
+        assert len(got) == len(want)
+        for g, w in zip(got, want):
+            if isinstance(w, float) and math.isnan(w):
+                assert isinstance(g, float) and math.isnan(g)
+            else:
+                assert g == w and type(g) is type(w)
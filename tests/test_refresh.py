@@ -0,0 +1,182 @@
+import io
+
+import openpyxl
+import pytest
+
+from deliverables_core import (
+    AppendState, WorkbookNotAppendable, build_fallout_table, convert_or_load, default_report, output_paths,
+    parse_csv, refresh_xlsx, report_path
+)
+from deliverables_excel import _copy_sheet_data, rows_xml
+
+# Deliverables Automation Tool — refresh tests
+# Author: Rose Anne Lafuente
+# Description: Refreshing a converted .xlsx after its CSV grew must give the
+# same workbook as converting the whole CSV again: AppendState tells appends
+# from rewrites, a half-written last line waits for the next refresh, the
+# new rows are spliced into the data sheet, and the Pivot sheet of the
+# report workbook follows the new counts.
+#
+# Usage:
+#   python -m pytest -q
+
+
+def write_bytes(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def append_bytes(path, data):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+def sheet_values(path):
+    # Not read_only: that pads each row to the widest row seen so far
+    wb = openpyxl.load_workbook(path)
+    return {ws.title: [list(row) for row in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+
+
+def convert(path):
+    out_file, sheet_name = output_paths(path)
+    state = AppendState()
+    convert_or_load(path, out_file, sheet_name, state=state, report=default_report)
+    return out_file, sheet_name, state
+
+
+def cut(data, at, partial=0):
+    # data up to the end of the line holding byte `at`, plus `partial` bytes of the next line
+    end = data.index(b"\n", at) + 1
+    return data[:end + partial]
+
+
+# --- AppendState ---
+def test_check_same_appended_rewritten(tmp_path):
+    path = write_bytes(tmp_path / "lot.csv", b"a,b\r\n1,2\r\n")
+    state = AppendState()
+    parse_csv(path, state=state)
+    assert state.check(path) == "same"
+
+    append_bytes(path, b"3,4\r\n")
+    assert state.check(path) == "appended"
+
+    write_bytes(path, b"a,c\r\n1,2\r\n3,4\r\n")
+    assert state.check(path) == "rewritten"
+    write_bytes(path, b"a,b\r\n")
+    assert state.check(path) == "rewritten"
+
+
+def test_unfinished_last_line_is_held_back(tmp_path):
+    path = write_bytes(tmp_path / "lot.csv", b"a,b\r\n1,2\r\n3,4")
+    state = AppendState()
+    rows = []
+    parse_csv(path, rows.append, state=state)
+    assert rows == [["a", "b"], [1, 2]]
+    assert state.tail is not None and state.row_count == 2
+
+    # The writer finishes the line: it is parsed whole, nothing is rebuilt
+    append_bytes(path, b"5\r\n6,7")
+    assert state.check(path) == "appended"
+    rows = []
+    parse_csv(path, rows.append, state=state)
+    assert rows == [[3, 45]]
+    assert state.tail is not None
+
+    # Still unchanged on the next pass: taken as the (newline-less) last line
+    rows = []
+    parse_csv(path, rows.append, state=state)
+    assert rows == [[6, 7]]
+    assert state.tail is None and state.row_count == 4
+    assert state.check(path) == "same"
+
+
+# --- Refresh vs a full conversion ---
+def test_append_matches_full_conversion(make_lot, tmp_path):
+    full = make_lot("full.csv").read_bytes()
+    (tmp_path / "grow").mkdir()
+    (tmp_path / "once").mkdir()
+    path = write_bytes(tmp_path / "grow" / "lot.csv", cut(full, len(full) // 2, partial=20))
+    out_file, sheet_name, state = convert(path)
+    assert state.tail is not None
+
+    for size in (len(full) * 3 // 4, len(full) - 1):
+        write_bytes(path, cut(full, size) if size < len(full) - 1 else full)
+        assert state.check(path) == "appended"
+        state, new_rows, rebuilt, fallout_table, end_tests = refresh_xlsx(
+            path, out_file, sheet_name, state, pivot_mark="MA1", end_test_top_n=2
+        )
+        assert new_rows and not rebuilt
+
+    expected_file, _, expected_state = convert(write_bytes(tmp_path / "once" / "lot.csv", full))
+    assert state.row_count == expected_state.row_count
+    assert state.counts.counts == expected_state.counts.counts
+    assert sheet_values(out_file) == sheet_values(expected_file)
+
+    # The Pivot sheet holds the table for the whole file
+    assert fallout_table == build_fallout_table(
+        expected_state.counts.for_mark("MA1"), expected_state.layout.theoretical_num
+    )
+    ws = openpyxl.load_workbook(report_path(out_file))["Pivot"]
+    assert ws["D4"].value == fallout_table[0][0]
+    assert [ws.cell(row=r, column=9).value for r in (4, 5)] == [fallout_table[0][0], fallout_table[1][0]]
+    assert [row[1] for row in end_tests] == [fallout_table[0][0], fallout_table[1][0]]
+
+
+def test_refresh_after_excel_save_rebuilds_the_data_sheet(make_lot, tmp_path):
+    full = make_lot("full.csv").read_bytes()
+    (tmp_path / "grow").mkdir()
+    path = write_bytes(tmp_path / "grow" / "lot.csv", cut(full, len(full) // 2))
+    out_file, sheet_name, state = convert(path)
+    openpyxl.load_workbook(out_file).save(out_file)    # styles + shared strings, like Excel
+
+    write_bytes(path, full)
+    new_state, new_rows, rebuilt, _, _ = refresh_xlsx(path, out_file, sheet_name, state)
+    assert not rebuilt and new_rows == new_state.row_count - state.row_count
+    assert len(sheet_values(out_file)[sheet_name]) == new_state.row_count
+
+
+def test_end_tests_follow_the_new_ranking(make_lot, tmp_path):
+    path = make_lot("lot.csv")
+    out_file, sheet_name, state = convert(str(path))
+    before = build_fallout_table(state.counts.for_mark("MA1"), state.layout.theoretical_num)
+    flood = "1060" if before[0][0] != "1060" else "1010"
+    rows = [f"{9000 + i},1,1,0,1,1,MA1,5,{flood},1,1,1,1,1,1,\r\n" for i in range(800)]
+    append_bytes(path, "".join(rows).encode())
+
+    _, new_rows, _, fallout_table, end_tests = refresh_xlsx(
+        str(path), out_file, sheet_name, state, pivot_mark="MA1", end_test_top_n=1
+    )
+    assert new_rows == 800
+    assert fallout_table[0][0] == flood
+    assert [row[1] for row in end_tests] == [flood]
+    ws = openpyxl.load_workbook(report_path(out_file))["Pivot"]
+    assert (ws["D4"].value, ws["I4"].value, ws["I5"].value) == (flood, flood, None)
+
+
+# --- Splicing rows into the sheet XML ---
+def test_rows_xml():
+    xml = rows_xml(5, [["a", 1, None, " x ", 2.5], [float("nan"), ""]])
+    assert xml == (
+        '<row r="5"><c r="A5" t="inlineStr"><is><t>a</t></is></c><c r="B5" t="n"><v>1</v></c>'
+        '<c r="D5" t="inlineStr"><is><t xml:space="preserve"> x </t></is></c><c r="E5" t="n"><v>2.5</v></c></row>'
+        '<row r="6"><c r="A6" t="n"><v /></c></row>'
+    ).encode()
+
+
+@pytest.mark.parametrize("sheet_data", [b"<sheetData><row r=\"1\" /></sheetData>", b"<sheetData />"])
+def test_copy_sheet_data_inserts_before_the_end(sheet_data):
+    src = io.BytesIO(b"<worksheet>" + sheet_data + b"<pageMargins /></worksheet>")
+    dst = io.BytesIO()
+    _copy_sheet_data(src, dst, b"<row r=\"2\" />")
+    assert dst.getvalue().endswith(b"<row r=\"2\" /></sheetData><pageMargins /></worksheet>")
+
+
+@pytest.mark.parametrize("sheet_xml", [
+    b'<worksheet><sheetData><row r="1"><c r="A1" s="1" /></row></sheetData></worksheet>',
+    b'<worksheet><dimension ref="A1" /><sheetData></sheetData></worksheet>',
+    b"<worksheet></worksheet>",
+])
+def test_copy_sheet_data_refuses_other_sheets(sheet_xml):
+    with pytest.raises(WorkbookNotAppendable):
+        _copy_sheet_data(io.BytesIO(sheet_xml), io.BytesIO(), b"")